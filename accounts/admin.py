@@ -1,29 +1,23 @@
 from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
-from django.utils import timezone
 
 # Sửa import: Bỏ 'create_otp_secret' từ utils
 from .models import User, SecurityPolicy, SecurityLog, BackupCode 
 # Sửa import: Lấy 'create_otp_secret' từ 'otp_algo'
 from .otp_algo import generate_base32_secret as create_otp_secret
+from . import security_log
 
 
-def _log(request, user, event, note=""):
-    # ... (giữ nguyên hàm _log) ...
-    SecurityLog.objects.create(
-        user=user,
-        event=event,
-        ip=request.META.get("REMOTE_ADDR", ""),
-        note=note,
-        created_at=timezone.now(),
-    )
+def _log_many(request, users, event, note=""):
+    # Audit cho cả nhóm user: bulk insert theo lô, ghi ngay (không qua hàng đợi)
+    return security_log.record_many(users, event, request=request, note=note)
 
 # ====== ACTIONS TRÊN USER (giữ nguyên) ======
 
 @admin.action(description="Reset OTP secret & buộc bật lại 2FA + ép đổi mật khẩu")
 def reset_otp_secret(modeladmin, request, queryset):
     # ... (giữ nguyên action reset_otp_secret) ...
-    count = 0
+    reset_ids = []
     for user in queryset:
         user.otp_secret = create_otp_secret()
         user.is_2fa_enabled = False
@@ -36,8 +30,8 @@ def reset_otp_secret(modeladmin, request, queryset):
         # Xóa luôn backup codes cũ khi reset OTP
         BackupCode.objects.filter(user=user).delete() 
         
-        _log(request, user, "RESET_OTP", note="Admin reset OTP secret + force pw reset")
-        count += 1
+        reset_ids.append(user.pk)
+    count = _log_many(request, reset_ids, "RESET_OTP", note="Admin reset OTP secret + force pw reset")
     messages.success(
         request,
         f"Đã reset OTP cho {count} user. Họ sẽ phải quét QR mới, đổi mật khẩu, và bật lại 2FA."
@@ -48,8 +42,7 @@ def reset_otp_secret(modeladmin, request, queryset):
 @admin.action(description="Bật cờ 'bắt buộc 2FA' cho user được chọn (must_setup_2fa=True)")
 def force_require_2fa(modeladmin, request, queryset):
     updated = queryset.update(must_setup_2fa=True)
-    for u in queryset:
-        _log(request, u, "FORCED_2FA", note="must_setup_2fa=True")
+    _log_many(request, queryset.values_list("pk", flat=True), "FORCED_2FA", note="must_setup_2fa=True")
     messages.success(
         request,
         f"Đã bật ép buộc 2FA cho {updated} user được chọn."
@@ -76,13 +69,13 @@ def disable_2fa(modeladmin, request, queryset):
 
 @admin.action(description="Mở khoá OTP (otp_locked=False, failed_otp_attempts=0)")
 def unlock_otp(modeladmin, request, queryset):
-    updated = 0
+    unlocked_ids = []
     for user in queryset:
         user.otp_locked = False
         user.failed_otp_attempts = 0
         user.save()
-        _log(request, user, "OTP_LOCKED", note="Admin unlocked OTP manually")
-        updated += 1
+        unlocked_ids.append(user.pk)
+    updated = _log_many(request, unlocked_ids, "OTP_LOCKED", note="Admin unlocked OTP manually")
     messages.success(
         request,
         f"Đã mở khoá OTP cho {updated} user."
@@ -92,8 +85,7 @@ def unlock_otp(modeladmin, request, queryset):
 @admin.action(description="Ép đổi mật khẩu (must_change_password=True)")
 def force_password_reset(modeladmin, request, queryset):
     updated = queryset.update(must_change_password=True)
-    for u in queryset:
-        _log(request, u, "FORCE_PW_RESET", note="Admin set must_change_password=True")
+    _log_many(request, queryset.values_list("pk", flat=True), "FORCE_PW_RESET", note="Admin set must_change_password=True")
     messages.success(
         request,
         f"Đã ép {updated} user phải đổi mật khẩu ở lần đăng nhập kế tiếp."
@@ -205,8 +197,10 @@ class SecurityPolicyAdmin(admin.ModelAdmin):
     @admin.action(description="Ép TOÀN BỘ user phải bật lại 2FA (must_setup_2fa=True)")
     def force_all_users_require_2fa(self, request, queryset):
         updated = User.objects.update(must_setup_2fa=True)
-        for u in User.objects.all():
-            _log(request, u, "FORCED_2FA", note="Global force via SecurityPolicy")
+        _log_many(
+            request, User.objects.all(),
+            "FORCED_2FA", note="Global force via SecurityPolicy",
+        )
         messages.success(
             request,
             f"Đã ép {updated} user phải bật 2FA. Lần đăng nhập tới ai chưa bật sẽ bị bắt quét OTP."
@@ -224,12 +218,26 @@ class SecurityPolicyAdmin(admin.ModelAdmin):
 
 @admin.register(SecurityLog)
 class SecurityLogAdmin(admin.ModelAdmin):
-    # ... (giữ nguyên) ...
     list_display = ("created_at", "user", "event", "ip", "note")
-    list_filter = ("event", "user")
-    search_fields = ("user__username", "ip", "note")
+    list_select_related = ("user",)
+    # Không lọc theo "user": bộ lọc đó liệt kê toàn bộ bảng User. Lọc user qua ô tìm kiếm.
+    list_filter = ("event", "created_at")
+    # Chỉ tìm trên cột có index: username (khớp chính xác), IP / CIDR tìm riêng
+    # (get_search_results). "note" không có index -> icontains quét cả bảng.
+    search_fields = ("=user__username",)
     ordering = ("-created_at",)
     readonly_fields = ("user", "event", "ip", "note", "created_at")
+    # Bảng rất lớn: không COUNT(*) toàn bảng trên mỗi trang
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if "." in term or ":" in term:
+            try:
+                return queryset.in_network(term), False
+            except ValueError:
+                pass  # không phải IP / CIDR
+        return super().get_search_results(request, queryset, search_term)
 
     def has_add_permission(self, request):
         return False  # không cho tạo tay
@@ -0,0 +1,66 @@
+import ipaddress
+
+from django.db import models
+
+
+class PackedIPField(models.Field):
+    """
+    Địa chỉ IP lưu dạng nhị phân 16 byte (IPv4 được map thành ::ffff:a.b.c.d),
+    nên so sánh byte = so sánh địa chỉ: tìm theo CIDR là 1 range scan trên index.
+
+    Giá trị phía Python là chuỗi đã chuẩn hoá ("1.2.3.4", "2001:db8::1").
+    Chuỗi rỗng / không phải IP được lưu là NULL.
+    """
+    description = "IP address (packed, 16 bytes)"
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("null", True)
+        kwargs.setdefault("blank", True)
+        super().__init__(*args, **kwargs)
+
+    def db_type(self, connection):
+        return {
+            "mysql": "varbinary(16)",
+            "postgresql": "bytea",
+            "oracle": "raw(16)",
+        }.get(connection.vendor, "blob")
+
+    @staticmethod
+    def pack(value):
+        if value in (None, ""):
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value)
+        try:
+            address = ipaddress.ip_address(str(value).strip())
+        except ValueError:
+            return None
+        if address.version == 4:
+            address = ipaddress.IPv6Address(f"::ffff:{address}")
+        return address.packed
+
+    @staticmethod
+    def unpack(value):
+        if value is None:
+            return None
+        address = ipaddress.IPv6Address(bytes(value))
+        return str(address.ipv4_mapped or address)
+
+    @classmethod
+    def network_range(cls, cidr):
+        """(đầu, cuối) dạng packed của mạng `cidr` ("10.0.0.0/8", "2001:db8::/32", "1.2.3.4")."""
+        network = ipaddress.ip_network(str(cidr).strip(), strict=False)
+        return cls.pack(network.network_address), cls.pack(network.broadcast_address)
+
+    def from_db_value(self, value, expression, connection):
+        return self.unpack(value)
+
+    def to_python(self, value):
+        if value in (None, ""):
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return self.unpack(value)
+        return value
+
+    def get_prep_value(self, value):
+        return self.pack(super().get_prep_value(value))
@@ -0,0 +1,95 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.models import SecurityLog
+
+FIELDS = ("id", "created_at", "event", "user_id", "user__username", "ip", "note")
+
+
+class Command(BaseCommand):
+    help = (
+        "Chuyển SecurityLog cũ hơn N ngày ra file JSONL nén gzip (mỗi tháng 1 file), "
+        "theo từng lô, rồi xóa khỏi DB."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'SECURITY_LOG_RETENTION_DAYS', 180),
+            help="Giữ lại log trong N ngày gần nhất",
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help="Số dòng xử lý mỗi lô")
+        parser.add_argument(
+            '--output-dir', default=getattr(settings, 'SECURITY_LOG_ARCHIVE_DIR', None),
+            help="Thư mục chứa file archive (security_log-YYYY-MM.jsonl.gz)",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Chỉ đếm, không ghi file / không xóa")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=max(options['days'], 1))
+        batch_size = options['batch_size']
+        output_dir = Path(options['output_dir'] or Path(settings.BASE_DIR) / "archive" / "security_logs")
+        dry_run = options['dry_run']
+        if not dry_run:
+            output_dir.mkdir(parents=True, exist_ok=True)
+
+        archived = 0
+        files = set()
+        last = None  # (created_at, id) của dòng cuối lô trước
+        while True:
+            qs = SecurityLog.objects.filter(created_at__lt=cutoff)
+            if last is not None:
+                qs = qs.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], pk__gt=last[1]))
+            rows = list(qs.order_by('created_at', 'pk').values(*FIELDS)[:batch_size])
+            if not rows:
+                break
+            last = (rows[-1]['created_at'], rows[-1]['id'])
+            archived += len(rows)
+            if dry_run:
+                continue
+
+            files.update(self._write(output_dir, rows))
+            # File đã được ghi và fsync xong mới xóa
+            with transaction.atomic():
+                SecurityLog.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+
+        if dry_run:
+            self.stdout.write(f"[dry-run] {archived} SecurityLog cũ hơn {cutoff:%Y-%m-%d %H:%M} sẽ được archive.")
+        else:
+            self.stdout.write(f"Đã archive và xóa {archived} SecurityLog vào {len(files)} file trong {output_dir}.")
+        self.stdout.write(self.style.SUCCESS("[OK] Done!"))
+
+    def _write(self, output_dir, rows):
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row['created_at'].strftime('%Y-%m'), []).append(row)
+
+        written = []
+        for month, month_rows in by_month.items():
+            path = output_dir / f"security_log-{month}.jsonl.gz"
+            # Mỗi lô là 1 gzip member nối vào cuối file (gzip đọc liền mạch nhiều member)
+            with open(path, 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+                    for row in month_rows:
+                        record = {
+                            'id': row['id'],
+                            'created_at': row['created_at'].isoformat(),
+                            'event': row['event'],
+                            'user_id': row['user_id'],
+                            'username': row['user__username'],
+                            'ip': row['ip'],
+                            'note': row['note'],
+                        }
+                        gz.write((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+                raw.flush()
+                os.fsync(raw.fileno())
+            written.append(path)
+        return written
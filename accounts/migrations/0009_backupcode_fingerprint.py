@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_user_avatar_user_bio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backupcode',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', help_text='HMAC (theo SECRET_KEY) của mã, dùng để tìm mã bằng index', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='backupcode',
+            index=models.Index(fields=['user', 'fingerprint'], name='accounts_backupcode_fp_idx'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+import accounts.fields
+
+
+def pack_ips(apps, schema_editor):
+    # IP dạng text -> 16 byte; giá trị không phải IP thành NULL
+    SecurityLog = apps.get_model('accounts', 'SecurityLog')
+    last_pk = 0
+    while True:
+        batch = list(
+            SecurityLog.objects
+            .filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', 'ip')[:5000]
+        )
+        if not batch:
+            return
+        for log in batch:
+            log.ip_packed = log.ip
+        SecurityLog.objects.bulk_update(batch, ['ip_packed'], batch_size=1000)
+        last_pk = batch[-1].pk
+
+
+def unpack_ips(apps, schema_editor):
+    SecurityLog = apps.get_model('accounts', 'SecurityLog')
+    last_pk = 0
+    while True:
+        batch = list(
+            SecurityLog.objects
+            .filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', 'ip_packed')[:5000]
+        )
+        if not batch:
+            return
+        for log in batch:
+            log.ip = log.ip_packed or ''
+        SecurityLog.objects.bulk_update(batch, ['ip'], batch_size=1000)
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_backupcode_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='securitylog',
+            name='ip_packed',
+            field=accounts.fields.PackedIPField(blank=True, null=True),
+        ),
+        migrations.RunPython(pack_ips, unpack_ips),
+        migrations.RemoveField(
+            model_name='securitylog',
+            name='ip',
+        ),
+        migrations.RenameField(
+            model_name='securitylog',
+            old_name='ip_packed',
+            new_name='ip',
+        ),
+        migrations.AddIndex(
+            model_name='securitylog',
+            index=models.Index(fields=['user', '-created_at'], name='accounts_seclog_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='securitylog',
+            index=models.Index(fields=['event', '-created_at'], name='accounts_seclog_event_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='securitylog',
+            index=models.Index(fields=['ip'], name='accounts_seclog_ip_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='securitylog',
+            index=models.Index(fields=['created_at'], name='accounts_seclog_created_idx'),
+        ),
+    ]
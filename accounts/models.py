@@ -2,9 +2,12 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils import timezone
 from django.conf import settings
-from django.contrib.auth.hashers import make_password, check_password
+from django.contrib.auth.hashers import make_password, check_password, PBKDF2PasswordHasher
+from django.utils.crypto import salted_hmac
 import secrets
 
+from .fields import PackedIPField
+
 class User(AbstractUser):
     ROLE_CHOICES = (
         ("ADMIN", "Admin"),
@@ -47,15 +50,12 @@ class User(AbstractUser):
         return self.role in ["ADMIN", "STAFF"]
     
     def get_reputation_points(self):
-        """Calculate user reputation based on activity"""
-        from forum.models import Post
-        posts_count = Post.objects.filter(author=self).count()
-        likes_received = Post.objects.filter(author=self).aggregate(total=models.Sum('likes'))['total'] or 0
-        threads_count = self.thread_set.count()
-        
-        # Points calculation
-        points = (posts_count * 2) + (likes_received * 5) + (threads_count * 10)
-        return points
+        """Điểm uy tín lưu sẵn trên UserProfile (cập nhật bởi forum.signals)"""
+        from forum.models import UserProfile
+        try:
+            return self.profile.reputation
+        except UserProfile.DoesNotExist:
+            return 0
     
     def get_reputation_rank(self):
         """Get user rank based on reputation points"""
@@ -81,15 +81,20 @@ class User(AbstractUser):
         
         plaintext_codes = []
         codes_to_create = []
+        hasher = BackupCodeHasher()
 
         for _ in range(10):
             # Tạo mã 8 ký tự (VD: abcd-1234)
             code = f"{secrets.token_hex(2)}-{secrets.token_hex(2)}" 
             plaintext_codes.append(code)
             
-            hashed_code = make_password(code) # Hash mã
             codes_to_create.append(
-                BackupCode(user=self, code_hash=hashed_code, is_used=False)
+                BackupCode(
+                    user=self,
+                    code_hash=make_password(code, hasher=hasher), # Hash mã
+                    fingerprint=BackupCode.fingerprint_for(self.pk, code),
+                    is_used=False,
+                )
             )
 
         BackupCode.objects.bulk_create(codes_to_create)
@@ -99,14 +104,44 @@ class User(AbstractUser):
         """
         Kiểm tra một mã khôi phục (plaintext) có hợp lệ và chưa dùng không.
         Nếu OK, đánh dấu là đã dùng.
+
+        Mã được tìm bằng fingerprint (1 query có index), sau đó chỉ check_password
+        đúng 1 lần -> mã sai không tốn hash nào. Đánh dấu đã dùng bằng UPDATE có
+        điều kiện is_used=False nên 2 request đồng thời không dùng được 1 mã 2 lần.
         """
-        unused_codes = BackupCode.objects.filter(user=self, is_used=False)
-        for backup_code in unused_codes:
+        code = BackupCode.normalize(code)
+        if not code:
+            return False
+
+        candidate = (
+            BackupCode.objects
+            .filter(user=self, is_used=False, fingerprint=BackupCode.fingerprint_for(self.pk, code))
+            .only("pk", "code_hash")
+            .first()
+        )
+        if candidate is None:
+            candidate = self._find_legacy_backup_code(code)
+        if candidate is None or not check_password(code, candidate.code_hash):
+            return False
+        return BackupCode.objects.filter(pk=candidate.pk, is_used=False).update(is_used=True) == 1
+
+    def has_legacy_backup_codes(self) -> bool:
+        """Còn mã khôi phục tạo trước khi có fingerprint (cần cấp lại, xem accounts.views)."""
+        return BackupCode.objects.filter(user=self, is_used=False, fingerprint="").exists()
+
+    def _find_legacy_backup_code(self, code: str):
+        """
+        Mã tạo trước khi có fingerprint: phải thử từng mã (mỗi mã 1 lần hash).
+        Mã cũ được cấp lại ở lần đăng nhập 2FA kế tiếp; sau BACKUP_CODE_LEGACY_UNTIL
+        thì không còn được chấp nhận.
+        """
+        until = getattr(settings, "BACKUP_CODE_LEGACY_UNTIL", None)
+        if until is not None and timezone.now().date() > until:
+            return None
+        for backup_code in BackupCode.objects.filter(user=self, is_used=False, fingerprint=""):
             if check_password(code, backup_code.code_hash):
-                backup_code.is_used = True
-                backup_code.save()
-                return True
-        return False
+                return backup_code
+        return None
 
 
 class SecurityPolicy(models.Model):
@@ -125,6 +160,16 @@ class SecurityPolicy(models.Model):
         return "Chính sách bảo mật hệ thống"
 
 
+class SecurityLogQuerySet(models.QuerySet):
+    def for_ip(self, address):
+        return self.filter(ip=address)
+
+    def in_network(self, cidr):
+        """Sự kiện từ mạng `cidr` ("10.0.0.0/8", "2001:db8::/32" hoặc 1 địa chỉ)."""
+        start, end = PackedIPField.network_range(cidr)
+        return self.filter(ip__range=(start, end))
+
+
 class SecurityLog(models.Model):
     """
     Nhật ký bảo mật: ai đăng nhập, OTP sai, tài khoản bị khóa OTP, v.v.
@@ -145,10 +190,23 @@ class SecurityLog(models.Model):
 
     user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     event = models.CharField(max_length=32, choices=EVENT_CHOICES)
-    ip = models.CharField(max_length=64, blank=True)
+    ip = PackedIPField()
     note = models.TextField(blank=True)
     created_at = models.DateTimeField(default=timezone.now)
 
+    objects = SecurityLogQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Lọc theo user / event trong admin, mới nhất trước
+            models.Index(fields=["user", "-created_at"], name="accounts_seclog_user_time_idx"),
+            models.Index(fields=["event", "-created_at"], name="accounts_seclog_event_time_idx"),
+            # Tra theo địa chỉ / dải CIDR (range scan trên giá trị packed)
+            models.Index(fields=["ip"], name="accounts_seclog_ip_idx"),
+            # Sắp xếp mặc định của admin + lệnh archive_security_logs
+            models.Index(fields=["created_at"], name="accounts_seclog_created_idx"),
+        ]
+
     def __str__(self):
         who = self.user.username if self.user else "unknown-user"
         return f"{self.created_at} {who} {self.event}"
@@ -176,11 +234,39 @@ class SecurityConfig(models.Model):
 # ----------------------------------
 # MODEL MỚI CHO MÃ KHÔI PHỤC
 # ----------------------------------
+class BackupCodeHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 ít vòng hơn mặc định cho mã khôi phục: mã chỉ dùng 1 lần, mỗi lần
+    thử chỉ hash 1 mã (tìm qua fingerprint) và bị giới hạn bởi lockout OTP.
+    Cùng algorithm với PBKDF2PasswordHasher nên check_password đọc được bình thường.
+    """
+    iterations = 100_000
+
+
 class BackupCode(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="backup_codes")
     code_hash = models.CharField(max_length=128, help_text="Mã khôi phục đã được hash")
+    fingerprint = models.CharField(
+        max_length=64, blank=True, default="",
+        help_text="HMAC (theo SECRET_KEY) của mã, dùng để tìm mã bằng index"
+    )
     is_used = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "fingerprint"], name="accounts_backupcode_fp_idx"),
+        ]
+
     def __str__(self):
-        return f"Backup code for {self.user.username} (Used: {self.is_used})"
\ No newline at end of file
+        return f"Backup code for {self.user.username} (Used: {self.is_used})"
+
+    @staticmethod
+    def normalize(code: str) -> str:
+        return (code or "").strip().replace(" ", "").lower()
+
+    @staticmethod
+    def fingerprint_for(user_id, code: str) -> str:
+        return salted_hmac(
+            "accounts.BackupCode.fingerprint", f"{user_id}:{BackupCode.normalize(code)}", algorithm="sha256"
+        ).hexdigest()
@@ -1,66 +1,148 @@
 # accounts/otp_algo.py
-# HOTP/TOTP thuần Python theo RFC 4226 & RFC 6238 (SHA-1, 6 digits, period=30)
+# HOTP/TOTP thuần Python theo RFC 4226 & RFC 6238 (mặc định SHA-1, 6 digits, period=30;
+# view đọc digits/period từ SecurityConfig). Đây là engine OTP duy nhất, accounts/utils.py gọi lại.
 
 import hmac, hashlib, struct, time, base64, secrets
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from urllib.parse import quote
 
-# Thêm 2 import này
-import qrcode
-from io import BytesIO
+# Số secret giữ key đã decode + HMAC đã nạp key trong mỗi process
+KEY_CACHE_SIZE = 4096
+# Số user được nhớ độ lệch đồng hồ (drift) trong mỗi process
+DRIFT_CACHE_SIZE = 10000
 
 # ---- Secret (Base32) ----
 def generate_base32_secret(nbytes: int = 20) -> str:
-    # ... (giữ nguyên hàm) ...
     raw = secrets.token_bytes(nbytes)
     b32 = base64.b32encode(raw).decode("ascii")
     return b32.strip("=").upper()
 
 def _b32decode(secret_b32: str) -> bytes:
-    # ... (giữ nguyên hàm) ...
     s = secret_b32.strip().replace(" ", "").upper()
     pad = (-len(s)) % 8
     s += "=" * pad
     return base64.b32decode(s, casefold=True)
 
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def _keyed_hmac(secret_b32: str, algo: str):
+    """
+    HMAC đã nạp key của secret (decode base32 + tính ipad/opad chỉ 1 lần).
+    Mỗi lần tính chỉ cần .copy() rồi update counter; bản gốc không bao giờ bị update.
+    """
+    return hmac.new(_b32decode(secret_b32), digestmod=getattr(hashlib, algo.lower()))
+
 # ---- HOTP ----
+def _hotp_int(base, counter: int) -> int:
+    h = base.copy()
+    h.update(struct.pack(">Q", counter))
+    d = h.digest()
+    o = d[-1] & 0x0F
+    return ((d[o] & 0x7F) << 24) | (d[o+1] << 16) | (d[o+2] << 8) | d[o+3]
+
 def hotp(secret_b32: str, counter: int, digits: int = 6, algo: str = "SHA1") -> str:
-    # ... (giữ nguyên hàm) ...
-    key = _b32decode(secret_b32)
-    msg = struct.pack(">Q", counter)
-    h = hmac.new(key, msg, getattr(hashlib, algo.lower())).digest()
-    o = h[-1] & 0x0F
-    code = ((h[o] & 0x7F) << 24) | (h[o+1] << 16) | (h[o+2] << 8) | (h[o+3])
-    code = code % (10 ** digits)
+    code = _hotp_int(_keyed_hmac(secret_b32, algo), counter) % (10 ** digits)
     return str(code).zfill(digits)
 
 # ---- TOTP ----
 def totp(secret_b32: str, for_time: int | None = None,
          period: int = 30, digits: int = 6, algo: str = "SHA1") -> str:
-    # ... (giữ nguyên hàm) ...
     if for_time is None:
         for_time = int(time.time())
     counter = int((for_time) // period)
     return hotp(secret_b32, counter, digits=digits, algo=algo)
 
-def verify_totp(secret_b32: str, code_str: str, period: int = 30,
-                digits: int = 6, algo: str = "SHA1", window: int = 1,
-                now: int | None = None) -> bool:
-    # ... (giữ nguyên hàm) ...
+# ---- Drift đồng hồ theo user ----
+# Bước lệch (so với đồng hồ server) của lần xác thực thành công gần nhất;
+# lần sau kiểm tra bước đó trước. Cửa sổ chấp nhận vẫn là ±window quanh bước hiện tại.
+_drift = OrderedDict()
+_drift_lock = threading.Lock()
+
+def get_drift(drift_key) -> int:
+    with _drift_lock:
+        return _drift.get(drift_key, 0)
+
+def _remember_drift(drift_key, offset: int):
+    with _drift_lock:
+        _drift[drift_key] = offset
+        _drift.move_to_end(drift_key)
+        while len(_drift) > DRIFT_CACHE_SIZE:
+            _drift.popitem(last=False)
+
+def _offsets(window: int, first: int = 0):
+    """Các bước lệch trong ±window, `first` trước rồi gần 0 trước."""
+    offsets = sorted(range(-window, window + 1), key=abs)
+    if first in offsets:
+        offsets.remove(first)
+        offsets.insert(0, first)
+    return offsets
+
+def _clean_code(code_str: str, digits: int) -> str | None:
     code = (code_str or "").strip().replace(" ", "")
     if not (code.isdigit() and len(code) == digits):
+        return None
+    return code
+
+def _match(base, code: str, t: int, offsets, digits: int) -> int | None:
+    mod = 10 ** digits
+    for w in offsets:
+        if hmac.compare_digest(str(_hotp_int(base, t + w) % mod).zfill(digits), code):
+            return w
+    return None
+
+def verify_totp(secret_b32: str, code_str: str, period: int = 30,
+                digits: int = 6, algo: str = "SHA1", window: int = 1,
+                now: int | None = None, drift_key=None) -> bool:
+    """
+    Kiểm tra mã TOTP trong cửa sổ ±window bước (so sánh constant-time).
+    drift_key (vd user.pk): nhớ bước lệch của user để lần sau thử bước đó trước.
+    """
+    code = _clean_code(code_str, digits)
+    if code is None or not secret_b32:
+        return False
+    try:
+        base = _keyed_hmac(secret_b32, algo)
+    except (ValueError, TypeError):
+        # secret hỏng (không phải base32)
         return False
+    if now is None:
+        now = int(time.time())
+    first = get_drift(drift_key) if drift_key is not None else 0
+    matched = _match(base, code, now // period, _offsets(window, first), digits)
+    if matched is None:
+        return False
+    if drift_key is not None and matched != first:
+        _remember_drift(drift_key, matched)
+    return True
+
+def verify_totp_many(pairs, period: int = 30, digits: int = 6, algo: str = "SHA1",
+                     window: int = 1, now: int | None = None) -> list[bool]:
+    """
+    Kiểm tra hàng loạt cặp (secret_b32, code) cùng một thời điểm (load test,
+    kiểm tra hàng loạt). Trả về list bool theo đúng thứ tự.
+    """
     if now is None:
         now = int(time.time())
     t = now // period
-    for w in range(-window, window + 1):
-        if hotp(secret_b32, t + w, digits=digits, algo=algo) == code:
-            return True
-    return False
+    offsets = _offsets(window)
+    results = []
+    for secret_b32, code_str in pairs:
+        code = _clean_code(code_str, digits)
+        if code is None or not secret_b32:
+            results.append(False)
+            continue
+        try:
+            base = _keyed_hmac(secret_b32, algo)
+        except (ValueError, TypeError):
+            results.append(False)
+            continue
+        results.append(_match(base, code, t, offsets, digits) is not None)
+    return results
 
 # ---- otpauth URI (để import vào Authenticator) ----
 def provisioning_uri(account_name: str, issuer_name: str, secret_b32: str,
                      algo: str = "SHA1", digits: int = 6, period: int = 30) -> str:
-    # ... (giữ nguyên hàm) ...
     label = f"{issuer_name}:{account_name}"
     params = (
         f"secret={secret_b32}"
@@ -76,14 +158,8 @@ def provisioning_uri(account_name: str, issuer_name: str, secret_b32: str,
 # ----------------------------------
 def qr_code_base64(data: str) -> str:
     """
-    Sinh QR code PNG base64 để nhúng vào <img src="data:image/png;base64, ...">
-    trong trang enable_2fa.html.
+    QR code PNG base64 để nhúng vào <img src="data:image/png;base64, ...">.
+    Trang bật 2FA dùng endpoint accounts:enable_2fa_qr (SVG) thay cho hàm này.
     """
-    qr = qrcode.QRCode(box_size=6, border=2)
-    qr.add_data(data)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    return base64.b64encode(buffer.getvalue()).decode("utf-8")
\ No newline at end of file
+    from . import qr
+    return qr.png_base64(data)
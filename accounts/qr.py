@@ -0,0 +1,84 @@
+# accounts/qr.py
+# Ảnh QR cho otpauth:// URI (trang bật 2FA), phục vụ qua endpoint riêng
+# accounts:enable_2fa_qr thay vì nhúng base64 vào HTML.
+#
+# - SVG (mặc định): vẽ thẳng từ ma trận QR thành 1 <path>, không cần PIL
+# - PNG: tùy chọn (?format=png), cần Pillow
+# Kết quả được giữ trong LRU có giới hạn theo (uri, format): F5 trang hay nhập
+# sai mã xác nhận không phải dựng lại QR.
+
+import base64
+import hashlib
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode
+
+# Số ảnh QR giữ trong mỗi process
+QR_CACHE_SIZE = 256
+# Kích thước 1 ô (px) và viền (số ô) khi hiển thị
+BOX_SIZE = 6
+BORDER = 2
+
+FORMATS = {
+    "svg": "image/svg+xml",
+    "png": "image/png",
+}
+
+
+def _qr(data: str):
+    qr = qrcode.QRCode(box_size=BOX_SIZE, border=BORDER)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def _svg(data: str) -> bytes:
+    matrix = _qr(data).get_matrix()  # đã gồm viền
+    size = len(matrix)
+    # Mỗi đoạn ô đen liên tiếp trên 1 hàng là 1 hình chữ nhật cao 1 ô
+    parts = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if row[x]:
+                start = x
+                while x < size and row[x]:
+                    x += 1
+                parts.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+            else:
+                x += 1
+    px = size * BOX_SIZE
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'width="{px}" height="{px}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{"".join(parts)}" fill="#000"/></svg>'
+    ).encode("ascii")
+
+
+def _png(data: str) -> bytes:
+    img = _qr(data).make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def render(data: str, fmt: str = "svg") -> bytes:
+    """Ảnh QR của `data` ở định dạng `fmt` ('svg' | 'png')."""
+    if fmt == "svg":
+        return _svg(data)
+    if fmt == "png":
+        return _png(data)
+    raise ValueError(f"Định dạng QR không hỗ trợ: {fmt!r}")
+
+
+def png_base64(data: str) -> str:
+    """PNG base64 để nhúng <img src="data:image/png;base64, ...">."""
+    return base64.b64encode(render(data, "png")).decode("utf-8")
+
+
+def fingerprint(data: str) -> str:
+    """Chuỗi ngắn đổi theo `data`, dùng làm tham số cache-busting cho URL ảnh."""
+    return hashlib.sha256(data.encode()).hexdigest()[:12]
@@ -0,0 +1,158 @@
+"""
+Ghi SecurityLog theo lô ở nền (giống forum.view_buffer).
+
+record() chỉ đưa sự kiện vào hàng đợi trong bộ nhớ process; 1 thread nền ghi
+xuống DB bằng bulk_create khi:
+  - đủ SECURITY_LOG_BATCH_SIZE sự kiện, hoặc
+  - sau mỗi SECURITY_LOG_FLUSH_INTERVAL giây, hoặc
+  - process tắt (atexit).
+
+Sự kiện không được phép mất (SYNC_EVENTS, hoặc record(..., sync=True)) được
+ghi ngay trong request. Hành động hàng loạt của admin dùng record_many(): bulk
+insert đồng bộ theo lô cho cả queryset.
+"""
+import atexit
+import logging
+import threading
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import QuerySet
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Luôn ghi đồng bộ
+SYNC_EVENTS = {"OTP_LOCKED"}
+
+_lock = threading.Lock()
+_pending = []   # SecurityLog chưa ghi
+_worker = None
+_wake = threading.Event()
+
+
+def _flush_interval():
+    return getattr(settings, "SECURITY_LOG_FLUSH_INTERVAL", 2)
+
+
+def _batch_size():
+    return getattr(settings, "SECURITY_LOG_BATCH_SIZE", 200)
+
+
+def _max_pending():
+    return getattr(settings, "SECURITY_LOG_MAX_PENDING", 10000)
+
+
+def _client_ip(request):
+    return request.META.get("REMOTE_ADDR", "") if request is not None else ""
+
+
+def _build(user, event, request=None, note=""):
+    from .models import SecurityLog
+
+    return SecurityLog(
+        user_id=getattr(user, "pk", user),
+        event=event,
+        ip=_client_ip(request),
+        note=note,
+        created_at=timezone.now(),
+    )
+
+
+def record(user, event, request=None, note="", sync=False):
+    """Ghi nhận 1 sự kiện bảo mật. `user` là User, id hoặc None."""
+    entry = _build(user, event, request=request, note=note)
+    if sync or event in SYNC_EVENTS:
+        entry.save()
+        return
+
+    with _lock:
+        _pending.append(entry)
+        full = len(_pending) >= _batch_size()
+    _ensure_worker()
+    if full:
+        _wake.set()
+
+
+def record_many(users, event, request=None, note=""):
+    """
+    Ghi cùng 1 sự kiện cho nhiều user (đồng bộ), bulk insert từng lô
+    SECURITY_LOG_BATCH_SIZE dòng. `users` là iterable User / id hoặc QuerySet
+    (chỉ đọc pk bằng iterator), nên cả bảng user cũng không nằm hết trong bộ nhớ.
+    Trả về số dòng.
+    """
+    from .models import SecurityLog
+
+    batch_size = _batch_size()
+    if isinstance(users, QuerySet):
+        users = users.values_list("pk", flat=True).iterator(chunk_size=batch_size)
+    users = iter(users)
+    ip = _client_ip(request)
+    now = timezone.now()
+    total = 0
+    while True:
+        entries = [
+            SecurityLog(user_id=getattr(user, "pk", user), event=event, ip=ip, note=note, created_at=now)
+            for user in islice(users, batch_size)
+        ]
+        if not entries:
+            return total
+        SecurityLog.objects.bulk_create(entries)
+        total += len(entries)
+
+
+def flush():
+    """Ghi toàn bộ hàng đợi xuống DB. Trả về số sự kiện đã ghi."""
+    from .models import SecurityLog, User
+
+    with _lock:
+        if not _pending:
+            return 0
+        entries = list(_pending)
+        _pending.clear()
+
+    try:
+        # User có thể đã bị xóa trong lúc chờ: vẫn giữ sự kiện, bỏ liên kết user
+        user_ids = {e.user_id for e in entries if e.user_id is not None}
+        existing = set(User.objects.filter(pk__in=user_ids).values_list("pk", flat=True))
+        for e in entries:
+            if e.user_id is not None and e.user_id not in existing:
+                e.user_id = None
+        SecurityLog.objects.bulk_create(entries, batch_size=_batch_size())
+    except Exception:
+        logger.exception("Không ghi được %d security log, sẽ thử lại", len(entries))
+        with _lock:
+            # Giữ lại để lần flush sau ghi tiếp, nhưng không để hàng đợi phình vô hạn
+            _pending[:0] = entries
+            overflow = len(_pending) - _max_pending()
+            if overflow > 0:
+                del _pending[:overflow]
+                logger.error("Bỏ %d security log cũ nhất do hàng đợi đầy", overflow)
+        return 0
+    return len(entries)
+
+
+# ============================================================================
+# WORKER NỀN
+# ============================================================================
+
+def _run():
+    while True:
+        _wake.wait(_flush_interval())
+        _wake.clear()
+        close_old_connections()
+        flush()
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None:
+        return
+    with _lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name="accounts-security-log", daemon=True)
+            _worker.start()
+
+
+atexit.register(flush)
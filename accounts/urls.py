@@ -20,6 +20,7 @@ urlpatterns = [
     
     path("enable-2fa/", views.enable_2fa_view, name="enable_2fa"),
     path("enable-2fa/complete/", views.enable_2fa_complete_view, name="enable_2fa_complete"),
+    path("enable-2fa/qr/", views.enable_2fa_qr_view, name="enable_2fa_qr"),
 
     # Ép đổi mật khẩu sau sự cố bảo mật
     path("change-password/", views.change_password_view, name="change_password"),
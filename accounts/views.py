@@ -3,12 +3,12 @@ from django.contrib import messages
 from django.contrib.auth import login, logout, get_user_model
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
-from django.http import HttpResponseForbidden, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseRedirect, Http404
+from django.views.decorators.cache import cache_control
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
-from django.utils import timezone
 from datetime import timedelta # Thêm import
 
 from .models import User, SecurityPolicy, SecurityLog, SecurityConfig
@@ -18,11 +18,9 @@ from .forms import (
     ChangePasswordForm, BackupCodeForm
 )
 from .tokens import email_verification_token
-# Sửa import: Bỏ qr_code_base64 từ utils
-from .otp_algo import (
-    generate_base32_secret, provisioning_uri, verify_totp,
-    qr_code_base64 # Lấy qr_code_base64 từ đây
-)
+from .otp_algo import generate_base32_secret, verify_totp
+from .utils import build_totp_uri
+from . import qr, security_log
 
 # Thêm các import cần thiết
 import time
@@ -30,15 +28,10 @@ import secrets
 import hmac
 
 
-def _log_event(user, event, request=None, note=""):
-    # ... (giữ nguyên hàm _log_event) ...
-    SecurityLog.objects.create(
-        user=user,
-        event=event,
-        ip=(request.META.get("REMOTE_ADDR", "") if request else ""),
-        note=note,
-        created_at=timezone.now(),
-    )
+def _log_event(user, event, request=None, note="", sync=False):
+    # Đưa vào hàng đợi ghi theo lô (accounts.security_log);
+    # sync=True cho sự kiện không được mất (vd lần sai khiến tài khoản bị khóa)
+    security_log.record(user, event, request=request, note=note, sync=sync)
 
 # --- Hàm trợ giúp cho session -----------------
 def _set_session_expiry(request, remember_me: bool):
@@ -52,9 +45,11 @@ def _set_session_expiry(request, remember_me: bool):
         request.session.set_expiry(0) # Hết hạn khi đóng browser
         request.session.pop('2fa_trusted', None)
 
-def _perform_login(request, user, remember_me: bool):
+def _perform_login(request, user, remember_me: bool, verified_2fa: bool = False):
     """
     Hàm trợ giúp: Đặt session expiry VÀ login user.
+    verified_2fa: vừa xác thực bằng mã TOTP hoặc mã khôi phục (không phải thiết bị
+    tin cậy / OTP email) -> mới được cấp lại bộ mã khôi phục cũ.
     """
     _set_session_expiry(request, remember_me)
     login(request, user)
@@ -64,6 +59,12 @@ def _perform_login(request, user, remember_me: bool):
         return redirect("accounts:enable_2fa")
     if user.must_change_password:
         return redirect("accounts:change_password")
+    if verified_2fa and user.is_2fa_enabled and user.has_legacy_backup_codes():
+        # Mã khôi phục cũ (không có fingerprint) tốn 1 lần hash cho mỗi mã khi nhập sai
+        # -> cấp bộ mã mới và hiển thị 1 lần như lúc bật 2FA
+        request.session['backup_codes'] = user.generate_backup_codes()
+        request.session['backup_codes_renewed'] = True
+        return redirect("accounts:enable_2fa_complete")
     return redirect("accounts:dashboard")
 # -----------------------------------------------
 
@@ -226,7 +227,10 @@ def otp_verify_view(request):
 
             # 1. Kiểm tra mã TOTP (từ app)
             if user.otp_secret:
-                totp_ok = verify_totp(user.otp_secret, code, period=30, digits=6, algo="SHA1", window=1)
+                totp_ok = verify_totp(
+                    user.otp_secret, code, period=config.otp_period, digits=config.otp_digits,
+                    algo="SHA1", window=1, drift_key=user.pk,
+                )
 
             # 2. Kiểm tra mã Email OTP (từ session)
             email_otp_code = request.session.get('email_otp_code')
@@ -248,7 +252,7 @@ def otp_verify_view(request):
                 _log_event(user, "OTP_SUCCESS", request=request, note=f"{note}, full login")
 
                 # Đăng nhập và xử lý session tin cậy
-                return _perform_login(request, user, remember_me)
+                return _perform_login(request, user, remember_me, verified_2fa=totp_ok)
             else:
                 # Cả 2 đều sai -> Thất bại
                 user.failed_otp_attempts += 1
@@ -259,7 +263,7 @@ def otp_verify_view(request):
                     user.otp_locked = True
                     note_msg += " -> LOCKED"
                 user.save()
-                _log_event(user, "OTP_FAIL", request=request, note=note_msg)
+                _log_event(user, "OTP_FAIL", request=request, note=note_msg, sync=user.otp_locked)
                 form.add_error("otp_code", "Mã OTP không hợp lệ hoặc đã hết hạn.")
     else:
         form = OTPForm()
@@ -357,7 +361,7 @@ def backup_code_verify_view(request):
                 _log_event(user, "BACKUP_CODE_USED", request=request, note="Login success (Backup Code)")
 
                 # Đăng nhập và xử lý session tin cậy
-                return _perform_login(request, user, remember_me)
+                return _perform_login(request, user, remember_me, verified_2fa=True)
             else:
                 # Thất bại -> Tăng bộ đếm sai
                 user.failed_otp_attempts += 1
@@ -367,7 +371,7 @@ def backup_code_verify_view(request):
                     user.otp_locked = True
                     note_msg += " -> LOCKED"
                 user.save()
-                _log_event(user, "OTP_FAIL", request=request, note=note_msg)
+                _log_event(user, "OTP_FAIL", request=request, note=note_msg, sync=user.otp_locked)
                 form.add_error("code", "Mã khôi phục không hợp lệ hoặc đã được sử dụng.")
     else:
         form = BackupCodeForm()
@@ -382,27 +386,22 @@ def backup_code_verify_view(request):
 @login_required
 def enable_2fa_view(request):
     user = request.user
+    config = SecurityConfig.get_solo()
 
     if not user.otp_secret:
         user.otp_secret = generate_base32_secret()
         user.save()
 
-    otp_uri = provisioning_uri(
-        # ... (giữ nguyên logic tạo otp_uri) ...
-        account_name=user.username,
-        issuer_name=getattr(settings, "SITE_NAME", "TwoFA Demo"),
-        secret_b32=user.otp_secret,
-        algo="SHA1",
-        digits=6,
-        period=30,
-    )
-    qr_b64 = qr_code_base64(otp_uri)
+    otp_uri = build_totp_uri(user, config)
 
     if request.method == "POST":
         form = OTPForm(request.POST) # Dùng OTPForm (không cần remember_me ở đây)
         if form.is_valid():
             code = form.cleaned_data["otp_code"]
-            ok = verify_totp(user.otp_secret, code, period=30, digits=6, algo="SHA1", window=1)
+            ok = verify_totp(
+                user.otp_secret, code, period=config.otp_period, digits=config.otp_digits,
+                algo="SHA1", window=1, drift_key=user.pk,
+            )
             
             if ok:
                 user.is_2fa_enabled = True
@@ -428,27 +427,46 @@ def enable_2fa_view(request):
         {
             # ... (giữ nguyên context) ...
             "form": form,
-            "qr_b64": qr_b64,
+            # Ảnh QR tải qua endpoint riêng (accounts:enable_2fa_qr), không nhúng base64;
+            # ?v đổi khi secret/cấu hình đổi để browser không dùng ảnh cũ
+            "qr_url": f"{reverse('accounts:enable_2fa_qr')}?v={qr.fingerprint(otp_uri)}",
             "otp_uri": otp_uri,
             "is_enabled": user.is_2fa_enabled,
             "secret_key": user.otp_secret,
             "issuer": getattr(settings, "SITE_NAME", "TwoFA Demo"),
             "account_name": user.username,
-            "digits": 6,
-            "period": 30,
+            "digits": config.otp_digits,
+            "period": config.otp_period,
             "algo": "SHA1",
         },
     )
 
+@login_required
+@cache_control(private=True, max_age=60)
+def enable_2fa_qr_view(request):
+    """
+    Ảnh QR cho trang bật 2FA. Mặc định SVG; ?format=png nếu client cần ảnh raster.
+    Chứa secret OTP -> chỉ cho browser của chính user cache (private, 60s).
+    """
+    user = request.user
+    fmt = request.GET.get("format", "svg")
+    if not user.otp_secret or fmt not in qr.FORMATS:
+        raise Http404
+
+    image = qr.render(build_totp_uri(user, SecurityConfig.get_solo()), fmt)
+    return HttpResponse(image, content_type=qr.FORMATS[fmt])
+
 # ----------------------------------
 # TẠO VIEW MỚI
 # ----------------------------------
 @login_required
 def enable_2fa_complete_view(request):
     """
-    Hiển thị mã khôi phục 1 LẦN DUY NHẤT sau khi bật 2FA.
+    Hiển thị mã khôi phục 1 LẦN DUY NHẤT sau khi bật 2FA
+    (hoặc khi bộ mã cũ được cấp lại lúc đăng nhập, renewed=True).
     """
     backup_codes = request.session.pop('backup_codes', None)
+    renewed = request.session.pop('backup_codes_renewed', False)
     if not backup_codes:
         # Nếu user F5 lại trang hoặc vào thẳng, chỉ redirect
         return redirect("accounts:dashboard")
@@ -456,7 +474,7 @@ def enable_2fa_complete_view(request):
     return render(
         request, 
         "accounts/enable_2fa_complete.html",
-        {"backup_codes": backup_codes}
+        {"backup_codes": backup_codes, "renewed": renewed}
     )
 
 
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: chi phí mỗi request của SlugRedirectMiddleware.
+
+So sánh bản cũ (unquote + quét ký tự 2 lần cho mọi request, unidecode/slugify
+mỗi lần khớp) với bản hiện tại (fast path ASCII, bỏ qua prefix, LRU).
+
+    python bench_slug_redirect.py [số vòng]
+"""
+import os
+import sys
+import timeit
+import urllib.parse
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'twofa_site.settings')
+django.setup()
+
+from django.shortcuts import redirect
+from django.test import RequestFactory
+from django.utils.text import slugify
+from unidecode import unidecode
+
+from forum.middleware import SlugRedirectMiddleware
+
+
+class LegacySlugRedirectMiddleware:
+    """Bản trước khi tối ưu, giữ lại để đo."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        path = request.path
+        decoded_path = urllib.parse.unquote(path)
+        if decoded_path != path or any(ord(char) > 127 for char in decoded_path):
+            parts = decoded_path.split('/')
+            new_parts = []
+            for part in parts:
+                if part and any(ord(char) > 127 for char in part):
+                    new_parts.append(slugify(unidecode(part)))
+                else:
+                    new_parts.append(part)
+            new_path = '/'.join(new_parts)
+            if new_path != decoded_path:
+                query_string = request.META.get('QUERY_STRING', '')
+                if query_string:
+                    new_path = f"{new_path}?{query_string}"
+                return redirect(new_path, permanent=True)
+        return self.get_response(request)
+
+
+PATHS = {
+    'ascii': '/forum/thread/12345/',
+    'static': '/static/css/style.css',
+    'admin': '/admin/forum/thread/12345/change/',
+    'vietnamese': '/forum/category/thảo-luận-chung/',
+}
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    factory = RequestFactory()
+
+    def get_response(request):
+        return None
+
+    middlewares = {
+        'before': LegacySlugRedirectMiddleware(get_response),
+        'after': SlugRedirectMiddleware(get_response),
+    }
+
+    print(f"{'path':<12} {'before (µs)':>12} {'after (µs)':>12} {'speedup':>9}")
+    for name, path in PATHS.items():
+        request = factory.get(path)
+        results = {}
+        for label, middleware in middlewares.items():
+            middleware(request)  # warm up (LRU)
+            seconds = min(timeit.repeat(lambda: middleware(request), number=number, repeat=5))
+            results[label] = seconds / number * 1e6
+        speedup = results['before'] / results['after'] if results['after'] else float('inf')
+        print(f"{name:<12} {results['before']:>12.3f} {results['after']:>12.3f} {speedup:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
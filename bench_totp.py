@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: chi phí xác thực 1 mã TOTP.
+
+So sánh 2 bản cũ (accounts/otp_algo.py và accounts/utils.py trước khi gộp:
+decode base32 + tạo HMAC mới cho từng bước thời gian, mỗi lần gọi) với engine
+hiện tại (accounts.otp_algo: cache HMAC đã nạp key, drift theo user, batch).
+
+    python bench_totp.py [số vòng]
+"""
+import base64
+import hashlib
+import hmac
+import struct
+import sys
+import time
+import timeit
+
+from accounts import otp_algo
+
+
+# ---- Bản cũ, giữ lại để đo ----
+
+def legacy_algo_hotp(secret_b32, counter, digits=6):
+    s = secret_b32.strip().replace(" ", "").upper()
+    s += "=" * ((-len(s)) % 8)
+    key = base64.b32decode(s, casefold=True)
+    h = hmac.new(key, struct.pack(">Q", counter), hashlib.sha1).digest()
+    o = h[-1] & 0x0F
+    code = ((h[o] & 0x7F) << 24) | (h[o+1] << 16) | (h[o+2] << 8) | (h[o+3])
+    return str(code % (10 ** digits)).zfill(digits)
+
+
+def legacy_algo_verify(secret_b32, code_str, period=30, digits=6, window=1, now=None):
+    code = (code_str or "").strip().replace(" ", "")
+    if not (code.isdigit() and len(code) == digits):
+        return False
+    if now is None:
+        now = int(time.time())
+    t = now // period
+    for w in range(-window, window + 1):
+        if legacy_algo_hotp(secret_b32, t + w, digits=digits) == code:
+            return True
+    return False
+
+
+def legacy_utils_code(secret_b32, for_time):
+    key = base64.b32decode(secret_b32.upper() + "=" * ((8 - len(secret_b32) % 8) % 8), casefold=True)
+    hmac_bytes = hmac.new(key, struct.pack(">Q", for_time // 30), hashlib.sha1).digest()
+    offset = hmac_bytes[-1] & 0x0F
+    code_int = struct.unpack(">I", hmac_bytes[offset:offset + 4])[0] & 0x7FFFFFFF
+    return str(code_int % (10 ** 6)).zfill(6)
+
+
+def legacy_utils_verify(secret_b32, code, valid_window=1, now=None):
+    now = int(time.time()) if now is None else now
+    for offset in range(-valid_window, valid_window + 1):
+        if hmac.compare_digest(legacy_utils_code(secret_b32, now + offset * 30), code.strip()):
+            return True
+    return False
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    now = 1_700_000_000
+    secret = otp_algo.generate_base32_secret()
+    cases = {
+        # mã của bước hiện tại (khớp ngay lần thử đầu)
+        'current': otp_algo.totp(secret, for_time=now),
+        # đồng hồ điện thoại chậm 1 bước (drift)
+        'drift -1': otp_algo.totp(secret, for_time=now - 30),
+        # mã sai: phải thử hết cửa sổ
+        'wrong': '000000' if otp_algo.totp(secret, for_time=now) != '000000' else '111111',
+    }
+
+    for code in cases.values():
+        assert legacy_algo_verify(secret, code, now=now) == legacy_utils_verify(secret, code, now=now) \
+            == otp_algo.verify_totp(secret, code, now=now)
+
+    print(f"{'case':<10} {'otp_algo cũ (µs)':>17} {'utils cũ (µs)':>14} {'engine (µs)':>12} {'speedup':>9}")
+    for name, code in cases.items():
+        otp_algo.verify_totp(secret, code, now=now, drift_key='bench')  # học drift
+        funcs = {
+            'algo': lambda: legacy_algo_verify(secret, code, now=now),
+            'utils': lambda: legacy_utils_verify(secret, code, now=now),
+            'engine': lambda: otp_algo.verify_totp(secret, code, now=now, drift_key='bench'),
+        }
+        results = {}
+        for label, func in funcs.items():
+            seconds = min(timeit.repeat(func, number=number, repeat=5))
+            results[label] = seconds / number * 1e6
+        speedup = min(results['algo'], results['utils']) / results['engine']
+        print(f"{name:<10} {results['algo']:>17.3f} {results['utils']:>14.3f} {results['engine']:>12.3f} {speedup:>8.1f}x")
+
+    # Batch: 1000 user khác nhau, mỗi user 1 mã đúng
+    secrets_ = [otp_algo.generate_base32_secret() for _ in range(1000)]
+    pairs = [(s, otp_algo.totp(s, for_time=now)) for s in secrets_]
+    otp_algo.verify_totp_many(pairs, now=now)  # warm up cache key
+    batch = min(timeit.repeat(lambda: otp_algo.verify_totp_many(pairs, now=now), number=20, repeat=5)) / 20
+    single = min(timeit.repeat(lambda: [legacy_algo_verify(s, c, now=now) for s, c in pairs], number=20, repeat=5)) / 20
+    print(f"\nbatch 1000 cặp: otp_algo cũ {single * 1e3:.2f} ms, verify_totp_many {batch * 1e3:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
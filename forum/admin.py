@@ -6,23 +6,24 @@ from .models import (
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('title', 'slug', 'parent', 'order', 'icon')
+    list_display = ('title', 'slug', 'parent', 'order', 'icon', 'thread_count', 'post_count')
     list_filter = ('parent',)
     search_fields = ('title', 'description')
+    readonly_fields = ('thread_count', 'post_count', 'last_post')
     prepopulated_fields = {'slug': ('title',)}
     ordering = ('order', 'title')
 
 @admin.register(Thread)
 class ThreadAdmin(admin.ModelAdmin):
-    list_display = ('title', 'category', 'author', 'prefix', 'pinned', 'locked', 'is_featured', 'views', 'created_at')
+    list_display = ('title', 'category', 'author', 'prefix', 'pinned', 'locked', 'is_featured', 'views', 'reply_count', 'last_post_at')
     list_filter = ('category', 'pinned', 'locked', 'is_featured', 'created_at')
     search_fields = ('title', 'author__username')
-    readonly_fields = ('created_at', 'updated_at', 'views')
+    readonly_fields = ('created_at', 'updated_at', 'views', 'reply_count', 'last_post_at', 'last_poster')
     list_editable = ('pinned', 'locked', 'is_featured')
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ('thread', 'author', 'likes', 'created_at')
+    list_display = ('thread', 'author', 'like_count', 'created_at')
     list_filter = ('created_at',)
     search_fields = ('content', 'author__username', 'thread__title')
     readonly_fields = ('created_at', 'updated_at')
@@ -0,0 +1,147 @@
+"""
+Snapshot cây category: cấu trúc dict/list thuần (không phải ORM object), gọn và
+pickle nhanh, dùng chung cho trang chủ, breadcrumb và dropdown chọn chuyên mục.
+
+- Bản chung nằm trong cache (TREE_CACHE_KEY) kèm số version (VERSION_CACHE_KEY).
+- Mỗi process giữ thêm 1 bản trong bộ nhớ, chỉ kiểm tra lại version tối đa
+  mỗi FORUM_CATEGORY_TREE_CHECK_INTERVAL giây -> đa số request không chạm cache/DB.
+- forum.signals gọi invalidate() khi Category/Thread/Post thay đổi.
+
+Mỗi node:
+    {'id', 'title', 'slug', 'description', 'icon', 'parent_id', 'children': [node, ...],
+     'thread_count', 'post_count',
+     'last_post': None | {'id', 'thread_id', 'thread_title', 'author_username', 'created_at'}}
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+TREE_CACHE_KEY = 'forum_category_tree'
+VERSION_CACHE_KEY = 'forum_category_tree_version'
+
+_local = {'version': None, 'tree': None, 'checked_at': 0.0}
+_lock = threading.Lock()
+
+
+def _check_interval():
+    return getattr(settings, 'FORUM_CATEGORY_TREE_CHECK_INTERVAL', 2)
+
+
+def build():
+    """Đọc toàn bộ category (1 truy vấn) và dựng snapshot."""
+    from .models import Category
+
+    nodes = {}
+    order = []
+    for c in Category.with_last_post().order_by('order', 'title'):
+        last = c.last_post
+        nodes[c.pk] = {
+            'id': c.pk,
+            'title': c.title,
+            'slug': c.slug,
+            'description': c.description,
+            'icon': c.icon,
+            'parent_id': c.parent_id,
+            'children': [],
+            'thread_count': c.thread_count,
+            'post_count': c.post_count,
+            'last_post': {
+                'id': last.pk,
+                'thread_id': last.thread_id,
+                'thread_title': last.thread.title,
+                'author_username': last.author.username,
+                'created_at': last.created_at,
+            } if last else None,
+        }
+        order.append(c.pk)
+
+    roots = []
+    for pk in order:
+        node = nodes[pk]
+        parent = nodes.get(node['parent_id'])
+        (parent['children'] if parent else roots).append(node)
+    return {'roots': roots, 'nodes': nodes}
+
+
+def version():
+    """Version hiện tại của cây (tăng mỗi lần invalidate())."""
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(VERSION_CACHE_KEY, version, None):
+            version = cache.get(VERSION_CACHE_KEY, version)
+    return version
+
+
+def get_tree():
+    now = time.monotonic()
+    if _local['tree'] is not None and now - _local['checked_at'] < _check_interval():
+        return _local['tree']
+
+    current = version()
+    with _lock:
+        if _local['tree'] is not None and _local['version'] == current:
+            _local['checked_at'] = now
+            return _local['tree']
+
+        cached = cache.get(TREE_CACHE_KEY)
+        if cached is not None and cached[0] == current:
+            tree = cached[1]
+        else:
+            tree = build()
+            cache.set(TREE_CACHE_KEY, (current, tree), None)
+
+        _local.update(version=current, tree=tree, checked_at=now)
+        return tree
+
+
+def invalidate():
+    """Đánh dấu snapshot cũ; process nào cũng sẽ dựng lại ở lần đọc kế tiếp."""
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, int(time.time() * 1000), None)
+    _local['checked_at'] = 0.0
+
+
+# ============================================================================
+# HELPERS CHO VIEW / FORM
+# ============================================================================
+
+def roots():
+    return get_tree()['roots']
+
+
+def get_node(category_id):
+    return get_tree()['nodes'].get(category_id)
+
+
+def get_node_by_slug(slug):
+    return next((node for node in get_tree()['nodes'].values() if node['slug'] == slug), None)
+
+
+def ancestors(category_id):
+    """Các node cha từ gốc xuống (không gồm chính category_id)."""
+    nodes = get_tree()['nodes']
+    path = []
+    node = nodes.get(category_id)
+    while node and node['parent_id'] in nodes:
+        node = nodes[node['parent_id']]
+        path.append(node)
+    path.reverse()
+    return path
+
+
+def choices(include_blank=True):
+    """Choices cho <select> chuyên mục, sub-forum thụt lề theo cây."""
+    result = [('', '---------')] if include_blank else []
+
+    def walk(nodes, depth):
+        for node in nodes:
+            result.append((node['id'], f"{'— ' * depth}{node['title']}"))
+            walk(node['children'], depth + 1)
+
+    walk(roots(), 0)
+    return result
@@ -0,0 +1,213 @@
+"""
+Pub/sub cho kênh SSE (forum.views.event_stream).
+
+Kênh:
+    user:<id>    -> {'type': 'unread', 'count': n | None}
+    thread:<id>  -> {'type': 'reply', 'thread_id', 'post_id', 'author'}
+
+publish() gọi được từ code sync (signal, view, worker nền); subscriber là
+coroutine chạy trên event loop ASGI, nhận sự kiện qua asyncio.Queue.
+
+Broker chọn bằng FORUM_EVENTS_BROKER (dotted path):
+  - InProcessBroker: chỉ phát cho subscriber trong cùng process (mặc định)
+  - CacheBroker: ghi sự kiện vào cache dùng chung (FORUM_EVENTS_CACHE_ALIAS),
+    mỗi process có 1 thread nền đọc lại và phát cho subscriber của mình ->
+    dùng khi chạy nhiều worker (stand-in cho Redis pub/sub).
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def thread_channel(thread_id):
+    return f"thread:{thread_id}"
+
+
+class Subscription:
+    def __init__(self, broker, channels, maxsize=100):
+        self.broker = broker
+        self.channels = list(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, channel, data):
+        """Gọi từ thread bất kỳ."""
+        self.loop.call_soon_threadsafe(self._put, channel, data)
+
+    def _put(self, channel, data):
+        try:
+            self.queue.put_nowait((channel, data))
+        except asyncio.QueueFull:
+            # Client đọc quá chậm: bỏ sự kiện, client sẽ tự đồng bộ lại khi reconnect
+            pass
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)  # channel -> {Subscription}
+
+    def subscribe(self, channels):
+        sub = Subscription(self, channels)
+        with self._lock:
+            for channel in sub.channels:
+                self._subscribers[channel].add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for channel in sub.channels:
+                subs = self._subscribers.get(channel)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subscribers[channel]
+
+    def channels(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    def dispatch(self, channel, data):
+        with self._lock:
+            subs = list(self._subscribers.get(channel, ()))
+        for sub in subs:
+            sub.deliver(channel, data)
+
+    def publish(self, channel, data):
+        self.dispatch(channel, data)
+
+
+class CacheBroker(InProcessBroker):
+    """
+    Sự kiện của mỗi kênh lưu trong cache dưới dạng ring buffer đánh số:
+    <prefix>:<channel>:seq (incr) và <prefix>:<channel>:<seq> -> data.
+    Thread nền poll seq của các kênh có subscriber trong process này.
+    """
+    prefix = 'forum:events'
+    ttl = 60
+
+    def __init__(self):
+        super().__init__()
+        self._seen = {}  # channel -> seq đã phát
+        self._poller = None
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[getattr(settings, 'FORUM_EVENTS_CACHE_ALIAS', 'default')]
+
+    def _seq_key(self, channel):
+        return f"{self.prefix}:{channel}:seq"
+
+    def publish(self, channel, data):
+        cache = self.cache
+        cache.add(self._seq_key(channel), 0, self.ttl)
+        try:
+            seq = cache.incr(self._seq_key(channel))
+        except ValueError:
+            cache.set(self._seq_key(channel), 1, self.ttl)
+            seq = 1
+        cache.set(f"{self.prefix}:{channel}:{seq}", data, self.ttl)
+
+    def subscribe(self, channels):
+        sub = super().subscribe(channels)
+        seqs = self.cache.get_many([self._seq_key(c) for c in sub.channels])
+        with self._lock:
+            for channel in sub.channels:
+                self._seen.setdefault(channel, seqs.get(self._seq_key(channel), 0))
+        self._ensure_poller()
+        return sub
+
+    def unsubscribe(self, sub):
+        super().unsubscribe(sub)
+        with self._lock:
+            for channel in sub.channels:
+                if channel not in self._subscribers:
+                    self._seen.pop(channel, None)
+
+    def poll(self):
+        channels = self.channels()
+        if not channels:
+            return
+        cache = self.cache
+        seqs = cache.get_many([self._seq_key(c) for c in channels])
+        wanted = {}
+        for channel in channels:
+            latest = seqs.get(self._seq_key(channel), 0)
+            seen = self._seen.get(channel, latest)
+            for seq in range(max(seen, latest - 50) + 1, latest + 1):
+                wanted[f"{self.prefix}:{channel}:{seq}"] = channel
+            self._seen[channel] = latest
+        if not wanted:
+            return
+        found = cache.get_many(list(wanted))
+        for key, channel in wanted.items():
+            if key in found:
+                self.dispatch(channel, found[key])
+
+    def _run(self):
+        interval = getattr(settings, 'FORUM_EVENTS_POLL_INTERVAL', 1)
+        while True:
+            time.sleep(interval)
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("CacheBroker: lỗi khi đọc sự kiện")
+
+    def _ensure_poller(self):
+        if self._poller is not None:
+            return
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._run, name="forum-events", daemon=True)
+                self._poller.start()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'FORUM_EVENTS_BROKER', 'forum.events.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish(channel, data):
+    try:
+        get_broker().publish(channel, data)
+    except Exception:
+        # Push chỉ là tối ưu: client vẫn có polling dự phòng
+        logger.exception("Không publish được sự kiện lên %s", channel)
+
+
+def subscribe(channels):
+    """Dùng trong coroutine: `async with subscribe([...]) as sub: await sub.get(timeout)`."""
+    return get_broker().subscribe(channels)
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Thread, Post, Report
+from . import category_tree
 
 
 class ThreadCreateForm(forms.ModelForm):
@@ -29,6 +30,11 @@ class ThreadCreateForm(forms.ModelForm):
             'title': 'Tiêu đề',
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Dropdown lấy từ snapshot cây category thay vì query Category mỗi lần render
+        self.fields['category'].choices = category_tree.choices()
+
 
 class PostForm(forms.ModelForm):
     class Meta:
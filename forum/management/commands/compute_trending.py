@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from forum.trending import compute_trending
+
+
+class Command(BaseCommand):
+    help = "Tính lại Thread.trending_score từ hoạt động gần đây (chạy định kỳ bằng cron)."
+
+    def handle(self, *args, **options):
+        count = compute_trending()
+        self.stdout.write(self.style.SUCCESS(f"[OK] {count} thread có điểm trending."))
@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+
+from forum.models import Category, Thread, Post
+
+
+class Command(BaseCommand):
+    help = "Tính lại các cột đếm denormalized của Category và Thread bằng truy vấn gộp."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Số thread xử lý mỗi lượt")
+
+    def handle(self, *args, **options):
+        categories = self.rebuild_categories()
+        threads = self.rebuild_threads(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"[OK] Đã cập nhật {categories} category, {threads} thread."
+        ))
+
+    def rebuild_categories(self):
+        thread_counts = dict(
+            Thread.objects.values_list('category_id').annotate(n=Count('id')).order_by()
+        )
+        post_counts = dict(
+            Post.objects.values_list('thread__category_id').annotate(n=Count('id')).order_by()
+        )
+        last_posts = dict(
+            Category.objects.annotate(latest_id=Category.latest_post_subquery()).values_list('pk', 'latest_id')
+        )
+
+        changed = []
+        for category in Category.objects.only('pk', 'thread_count', 'post_count', 'last_post'):
+            values = (
+                thread_counts.get(category.pk, 0),
+                post_counts.get(category.pk, 0),
+                last_posts.get(category.pk),
+            )
+            if values != (category.thread_count, category.post_count, category.last_post_id):
+                category.thread_count, category.post_count, category.last_post_id = values
+                changed.append(category)
+
+        with transaction.atomic():
+            Category.objects.bulk_update(changed, ['thread_count', 'post_count', 'last_post'], batch_size=500)
+        return len(changed)
+
+    def rebuild_threads(self, chunk_size):
+        updated = 0
+        last_pk = 0
+        while True:
+            chunk = list(
+                Thread.objects
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .only('pk', 'created_at', 'reply_count', 'last_post_at', 'last_poster')
+                [:chunk_size]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            ids = [t.pk for t in chunk]
+
+            stats = {
+                row['thread_id']: row
+                for row in Post.objects.filter(thread_id__in=ids)
+                .values('thread_id').annotate(n=Count('id'), latest_at=Max('created_at')).order_by()
+            }
+            posters = dict(
+                Thread.objects.filter(pk__in=ids)
+                .annotate(poster_id=Thread.latest_post_subquery('author'))
+                .values_list('pk', 'poster_id')
+            )
+
+            changed = []
+            for thread in chunk:
+                row = stats.get(thread.pk)
+                values = (
+                    max(row['n'] - 1, 0) if row else 0,
+                    row['latest_at'] if row else thread.created_at,
+                    posters.get(thread.pk),
+                )
+                if values != (thread.reply_count, thread.last_post_at, thread.last_poster_id):
+                    thread.reply_count, thread.last_post_at, thread.last_poster_id = values
+                    changed.append(thread)
+
+            with transaction.atomic():
+                Thread.objects.bulk_update(changed, ['reply_count', 'last_post_at', 'last_poster'])
+            updated += len(changed)
+        return updated
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from forum.models import Post, PostReaction
+
+
+class Command(BaseCommand):
+    help = "Tính lại các cột đếm reaction trên Post từ bảng PostReaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Số post xử lý mỗi lượt")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        fields = Post.reaction_fields()
+
+        updated = 0
+        last_pk = 0
+        while True:
+            chunk = list(
+                Post.objects
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .only('pk', *fields)
+                [:chunk_size]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+
+            counts = {}
+            rows = (
+                PostReaction.objects
+                .filter(post_id__in=[p.pk for p in chunk])
+                .values_list('post_id', 'reaction_type')
+                .annotate(n=Count('id'))
+                .order_by()
+            )
+            for post_id, reaction_type, n in rows:
+                counts[(post_id, Post.reaction_field(reaction_type))] = n
+
+            changed = []
+            for post in chunk:
+                values = [counts.get((post.pk, field), 0) for field in fields]
+                if values != [getattr(post, field) for field in fields]:
+                    for field, value in zip(fields, values):
+                        setattr(post, field, value)
+                    changed.append(post)
+
+            with transaction.atomic():
+                Post.objects.bulk_update(changed, fields)
+            updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f"[OK] Đã sửa cột đếm reaction của {updated} post."))
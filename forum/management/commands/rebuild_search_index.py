@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from forum import search_engine
+from forum.models import Thread, Post, SearchDocument, SearchTerm
+
+
+class Command(BaseCommand):
+    help = "Xây lại toàn bộ inverted index tìm kiếm (SearchTerm / SearchDocument / SearchPosting)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help="Số post index mỗi lượt")
+        parser.add_argument(
+            '--prune-terms', action='store_true',
+            help="Không index lại, chỉ xóa SearchTerm không còn posting (chạy định kỳ)",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        if options['prune_terms']:
+            pruned = search_engine.prune_terms(chunk_size)
+            self.stdout.write(self.style.SUCCESS(f"[OK] Đã xóa {pruned} term không còn dùng."))
+            return
+
+        SearchDocument.objects.all().delete()
+        SearchTerm.objects.all().delete()
+
+        threads = 0
+        for thread in Thread.objects.order_by('pk').iterator(chunk_size=chunk_size):
+            search_engine.index_thread(thread)
+            threads += 1
+
+        posts = 0
+        last_pk = 0
+        while True:
+            chunk = list(
+                Post.objects.filter(pk__gt=last_pk).select_related('thread').order_by('pk')[:chunk_size]
+            )
+            if not chunk:
+                break
+            search_engine.index_posts_bulk(chunk)
+            last_pk = chunk[-1].pk
+            posts += len(chunk)
+            self.stdout.write(f"  ... {posts} post")
+
+        cache.delete(search_engine.STATS_CACHE_KEY)
+        self.stdout.write(self.style.SUCCESS(f"[OK] Đã index {threads} thread, {posts} post."))
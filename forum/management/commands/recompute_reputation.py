@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from forum.models import UserProfile
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Tính lại UserProfile.reputation của mọi user bằng truy vấn gộp theo lô."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Số user xử lý mỗi lượt")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        updated = created = 0
+        last_pk = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+            )
+            if not user_ids:
+                break
+            last_pk = user_ids[-1]
+
+            stats = UserProfile.activity_stats(user_ids)
+            profiles = {p.user_id: p for p in UserProfile.objects.filter(user_id__in=user_ids).only('pk', 'user', 'reputation')}
+            changed = []
+            for profile in profiles.values():
+                value = UserProfile.compute_reputation(*stats[profile.user_id])
+                if profile.reputation != value:
+                    profile.reputation = value
+                    changed.append(profile)
+            # Profile mới: điền đủ các cột denormalized, không chỉ reputation
+            missing = [
+                UserProfile(user_id=user_id).apply_stats(*stats[user_id])
+                for user_id in user_ids if user_id not in profiles
+            ]
+
+            with transaction.atomic():
+                UserProfile.objects.bulk_update(changed, ['reputation'])
+                UserProfile.objects.bulk_create(missing)
+            updated += len(changed)
+            created += len(missing)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"[OK] Đã cập nhật uy tín của {updated} user, tạo {created} profile mới."
+        ))
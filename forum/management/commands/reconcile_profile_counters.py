@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from forum.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "So UserProfile.post_count / thread_count với số đếm thực tế và sửa các dòng bị lệch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Số profile xử lý mỗi lượt")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        checked = fixed = 0
+        last_pk = 0
+        while True:
+            chunk = list(
+                UserProfile.objects
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .only('pk', 'user', 'post_count', 'thread_count')
+                [:chunk_size]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            user_ids = [p.user_id for p in chunk]
+
+            stats = UserProfile.activity_stats(user_ids)
+
+            changed = []
+            for profile in chunk:
+                posts, threads, _ = stats[profile.user_id]
+                if (posts, threads) != (profile.post_count, profile.thread_count):
+                    profile.post_count, profile.thread_count = posts, threads
+                    changed.append(profile)
+
+            with transaction.atomic():
+                UserProfile.objects.bulk_update(changed, ['post_count', 'thread_count'])
+            checked += len(chunk)
+            fixed += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"[OK] Đã kiểm tra {checked} profile, sửa {fixed} profile bị lệch."
+        ))
@@ -0,0 +1,130 @@
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from forum.models import ThreadView, ThreadViewDaily, RollupWatermark
+
+WATERMARK = RollupWatermark.THREAD_VIEWS
+
+
+class Command(BaseCommand):
+    help = (
+        "Cộng dồn các ThreadView mới (id > watermark, cũ hơn FORUM_VIEW_ROLLUP_LAG giây) vào ThreadViewDaily, "
+        "sau đó xóa ThreadView cũ hơn FORUM_THREAD_VIEW_RETENTION_DAYS theo từng lô."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Số ThreadView xử lý mỗi lô")
+        parser.add_argument('--no-purge', action='store_true', help="Chỉ rollup, không xóa dữ liệu thô")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rolled = self.rollup(batch_size)
+        self.stdout.write(f"Rollup {rolled} ThreadView.")
+
+        if not options['no_purge']:
+            purged = self.purge(batch_size)
+            self.stdout.write(f"Đã xóa {purged} ThreadView cũ.")
+
+        self.stdout.write(self.style.SUCCESS("[OK] Done!"))
+
+    def rollup(self, batch_size):
+        mark, _ = RollupWatermark.objects.get_or_create(name=WATERMARK)
+        # id không commit theo thứ tự: 1 lô bulk_create của view_buffer đang ghi dở có
+        # thể nhận id nhỏ hơn các dòng đã thấy. Chỉ đi qua các dòng đã ghi đủ lâu
+        # (created_at, không phải viewed_at: lượt xem flush lại sau lỗi giữ viewed_at cũ),
+        # dừng ở dòng mới đầu tiên để lần chạy sau đọc lại từ đó.
+        lag = getattr(settings, 'FORUM_VIEW_ROLLUP_LAG', 300)
+        settled_before = timezone.now() - timedelta(seconds=lag)
+        total = 0
+        while True:
+            rows = list(
+                ThreadView.objects
+                .filter(pk__gt=mark.last_id)
+                .order_by('pk')
+                .values_list('pk', 'thread_id', 'viewed_at', 'created_at')[:batch_size]
+            )
+            settled = next((i for i, row in enumerate(rows) if row[3] >= settled_before), len(rows))
+            done = settled < len(rows)
+            rows = rows[:settled]
+            if not rows:
+                return total
+
+            counts = Counter((thread_id, viewed_at.date()) for _, thread_id, viewed_at, _ in rows)
+            with transaction.atomic():
+                self._apply(counts)
+                mark.last_id = rows[-1][0]
+                mark.save(update_fields=['last_id', 'updated_at'])
+            total += len(rows)
+            if done:
+                return total
+
+    def _apply(self, counts):
+        thread_ids = {thread_id for thread_id, _ in counts}
+        days = {day for _, day in counts}
+        existing = {
+            (d.thread_id, d.date): d
+            for d in ThreadViewDaily.objects.filter(thread_id__in=thread_ids, date__in=days)
+        }
+
+        for key, views in counts.items():
+            if key in existing:
+                ThreadViewDaily.objects.filter(pk=existing[key].pk).update(views=F('views') + views)
+        ThreadViewDaily.objects.bulk_create([
+            ThreadViewDaily(thread_id=thread_id, date=day, views=views)
+            for (thread_id, day), views in counts.items()
+            if (thread_id, day) not in existing
+        ])
+
+        # Người xem duy nhất không cộng dồn được -> đếm lại cho các (thread, ngày) bị ảnh hưởng.
+        # Dòng thô của ngày cũ có thể đã bị purge một phần -> không hạ thấp giá trị đã lưu.
+        start = datetime.combine(min(days), time.min)
+        end = datetime.combine(max(days), time.min) + timedelta(days=1)
+        uniques = (
+            ThreadView.objects
+            .filter(thread_id__in=thread_ids, viewed_at__gte=start, viewed_at__lt=end)
+            .annotate(day=TruncDate('viewed_at'))
+            .values('thread_id', 'day')
+            .annotate(
+                users=Count('user', distinct=True),
+                guests=Count('ip_address', distinct=True, filter=Q(user__isnull=True)),
+            )
+            .order_by()
+        )
+        unique_by_key = {(row['thread_id'], row['day']): row['users'] + row['guests'] for row in uniques}
+        dailies = [
+            d for d in ThreadViewDaily.objects.filter(thread_id__in=thread_ids, date__in=days)
+            if (d.thread_id, d.date) in counts
+        ]
+        for d in dailies:
+            d.unique_viewers = max(d.unique_viewers, unique_by_key.get((d.thread_id, d.date), 0))
+        ThreadViewDaily.objects.bulk_update(dailies, ['unique_viewers'], batch_size=500)
+
+    def purge(self, batch_size):
+        days = getattr(settings, 'FORUM_THREAD_VIEW_RETENTION_DAYS', None)
+        if not days:
+            return 0
+
+        # Chỉ xóa các dòng đã rollup, và luôn giữ nguyên ngày hiện tại
+        # để số người xem duy nhất của ngày đó vẫn đếm lại được.
+        cutoff = datetime.combine(timezone.now().date() - timedelta(days=max(days, 1)), time.min)
+        watermark = RollupWatermark.objects.filter(name=WATERMARK).values_list('last_id', flat=True).first() or 0
+
+        purged = 0
+        while True:
+            ids = list(
+                ThreadView.objects
+                .filter(pk__lte=watermark, viewed_at__lt=cutoff)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return purged
+            ThreadView.objects.filter(pk__in=ids).delete()
+            purged += len(ids)
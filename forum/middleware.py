@@ -1,51 +1,89 @@
 """
 Middleware to redirect old slugs with Vietnamese characters to new ASCII slugs
 """
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
 from django.shortcuts import redirect
-from django.urls import resolve
 from unidecode import unidecode
 from django.utils.text import slugify
 import urllib.parse
 
 
+@lru_cache(maxsize=1024)
+def _ascii_path(path):
+    """
+    Đường dẫn ASCII tương ứng với `path`, hoặc None nếu không cần redirect.
+    Có LRU giới hạn nên mỗi URL cũ chỉ phải unidecode/slugify một lần.
+    """
+    # Decode URL to get actual Vietnamese text
+    decoded_path = urllib.parse.unquote(path)
+    if decoded_path.isascii() and decoded_path == path:
+        return None
+
+    # Convert Vietnamese to ASCII, chỉ những đoạn có ký tự non-ASCII
+    new_parts = [
+        slugify(unidecode(part)) if part and not part.isascii() else part
+        for part in decoded_path.split('/')
+    ]
+    new_path = '/'.join(new_parts)
+
+    # Only redirect if path actually changed
+    return new_path if new_path != decoded_path else None
+
+
+def _excluded_prefixes():
+    prefixes = getattr(settings, 'FORUM_SLUG_REDIRECT_EXCLUDE_PREFIXES', None)
+    if prefixes is None:
+        prefixes = [settings.STATIC_URL, settings.MEDIA_URL, '/admin/']
+    return tuple(p if p.startswith('/') else f'/{p}' for p in prefixes if p)
+
+
 class SlugRedirectMiddleware:
-    """Redirect URLs with Vietnamese slugs to ASCII slugs"""
-    
+    """
+    Redirect URLs with Vietnamese slugs to ASCII slugs.
+
+    Chạy được cả sync lẫn async (như MiddlewareMixin của Django): dưới ASGI,
+    view async (vd SSE forum.views.event_stream) không bị ép qua thread sync.
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
-    
+        self.excluded_prefixes = _excluded_prefixes()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
     def __call__(self, request):
-        # Check if URL contains encoded Vietnamese characters
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self._redirect(request)
+        return response if response is not None else self.get_response(request)
+
+    async def __acall__(self, request):
+        response = self._redirect(request)
+        return response if response is not None else await self.get_response(request)
+
+    def _redirect(self, request):
+        """Response redirect 301 sang đường dẫn ASCII, hoặc None để đi tiếp."""
         path = request.path
-        
-        # Decode URL to get actual Vietnamese text
-        decoded_path = urllib.parse.unquote(path)
-        
-        # If path contains Vietnamese characters, redirect to ASCII version
-        if decoded_path != path or any(ord(char) > 127 for char in decoded_path):
-            # Convert Vietnamese to ASCII
-            parts = decoded_path.split('/')
-            new_parts = []
-            
-            for part in parts:
-                if part and any(ord(char) > 127 for char in part):
-                    # This part has Vietnamese chars, convert it
-                    ascii_part = unidecode(part)
-                    new_part = slugify(ascii_part)
-                    new_parts.append(new_part)
-                else:
-                    new_parts.append(part)
-            
-            new_path = '/'.join(new_parts)
-            
-            # Only redirect if path actually changed
-            if new_path != decoded_path:
-                # Preserve query string
-                query_string = request.META.get('QUERY_STRING', '')
-                if query_string:
-                    new_path = f"{new_path}?{query_string}"
-                
-                return redirect(new_path, permanent=True)
-        
-        response = self.get_response(request)
-        return response
+
+        # Fast path: đa số request là ASCII thuần, không có ký tự encode
+        if path.isascii() and '%' not in path:
+            return None
+
+        # Static / media / admin không bao giờ có slug tiếng Việt
+        if path.startswith(self.excluded_prefixes):
+            return None
+
+        new_path = _ascii_path(path)
+        if new_path is None:
+            return None
+        # Preserve query string
+        query_string = request.META.get('QUERY_STRING', '')
+        if query_string:
+            new_path = f"{new_path}?{query_string}"
+        return redirect(new_path, permanent=True)
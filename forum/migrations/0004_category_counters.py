@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    Category = apps.get_model('forum', 'Category')
+    Thread = apps.get_model('forum', 'Thread')
+    Post = apps.get_model('forum', 'Post')
+    for category in Category.objects.all():
+        posts = Post.objects.filter(thread__category=category)
+        category.thread_count = Thread.objects.filter(category=category).count()
+        category.post_count = posts.count()
+        category.last_post = posts.order_by('-created_at', '-pk').first()
+        category.save(update_fields=['thread_count', 'post_count', 'last_post'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0003_postreaction_reaction_type_userprofile_threadview'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='last_post',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='forum.post'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='thread_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_activity(apps, schema_editor):
+    Thread = apps.get_model('forum', 'Thread')
+    Post = apps.get_model('forum', 'Post')
+    for thread in Thread.objects.all().iterator():
+        posts = Post.objects.filter(thread=thread)
+        latest = posts.order_by('-created_at', '-pk').first()
+        thread.reply_count = max(posts.count() - 1, 0)
+        thread.last_post_at = latest.created_at if latest else thread.created_at
+        thread.last_poster_id = latest.author_id if latest else None
+        thread.save(update_fields=['reply_count', 'last_post_at', 'last_poster'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0004_category_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='thread',
+            options={'ordering': ['-pinned', '-last_post_at']},
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='last_post_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='last_poster',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['category', '-pinned', '-last_post_at'], name='forum_thread_cat_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['-last_post_at'], name='forum_thread_active_idx'),
+        ),
+        migrations.RunPython(populate_activity, migrations.RunPython.noop),
+    ]
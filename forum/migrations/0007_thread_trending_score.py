@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0006_threadviewdaily_rollupwatermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='trending_score',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:10
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_reaction_counts(apps, schema_editor):
+    Post = apps.get_model('forum', 'Post')
+    PostReaction = apps.get_model('forum', 'PostReaction')
+    counts = defaultdict(dict)
+    rows = PostReaction.objects.values_list('post_id', 'reaction_type').annotate(n=Count('id')).order_by()
+    for post_id, reaction_type, n in rows:
+        counts[post_id][f"{reaction_type}_count"] = n
+    for post_id, values in counts.items():
+        Post.objects.filter(pk=post_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0009_notification_user_read_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='post',
+            name='likes',
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='angry_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='laugh_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='love_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='sad_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_reaction_counts, migrations.RunPython.noop),
+    ]
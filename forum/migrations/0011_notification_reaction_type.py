@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+def reactions_out_of_mentions(apps, schema_editor):
+    # toggle_reaction trước đây ghi notification reaction với type 'mention'
+    Notification = apps.get_model('forum', 'Notification')
+    Notification.objects.filter(notification_type='mention', message__contains=' đã react ').update(
+        notification_type='reaction'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0010_post_reaction_counts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('thread_reply', 'Có người reply thread của bạn'), ('mention', 'Bạn được mention'), ('profile_post', 'Có người post lên profile của bạn'), ('thread_follow', 'Thread bạn theo dõi có bài mới'), ('reaction', 'Có người react bài viết của bạn')], max_length=20),
+        ),
+        migrations.RunPython(reactions_out_of_mentions, migrations.RunPython.noop),
+    ]
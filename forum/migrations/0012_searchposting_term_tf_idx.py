@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0011_notification_reaction_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='searchposting',
+            index=models.Index(fields=['term', '-tf', 'document'], name='forum_searchpost_term_tf_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Sum
+
+# Trọng số tại thời điểm migration (UserProfile.REPUTATION_*)
+REPUTATION_PER_POST = 2
+REPUTATION_PER_THREAD = 10
+REPUTATION_PER_LIKE = 5
+
+CHUNK_SIZE = 1000
+
+
+def populate_profile_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserProfile = apps.get_model('forum', 'UserProfile')
+    Post = apps.get_model('forum', 'Post')
+    Thread = apps.get_model('forum', 'Thread')
+
+    last_pk = 0
+    while True:
+        user_ids = list(
+            User.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:CHUNK_SIZE]
+        )
+        if not user_ids:
+            break
+        last_pk = user_ids[-1]
+
+        posts = {
+            author_id: (n, likes or 0)
+            for author_id, n, likes in Post.objects.filter(author_id__in=user_ids)
+            .values_list('author_id').annotate(n=Count('id'), likes=Sum('like_count')).order_by()
+        }
+        threads = dict(
+            Thread.objects.filter(author_id__in=user_ids)
+            .values_list('author_id').annotate(n=Count('id')).order_by()
+        )
+
+        def fields(user_id):
+            post_count, likes = posts.get(user_id, (0, 0))
+            thread_count = threads.get(user_id, 0)
+            return {
+                'post_count': post_count,
+                'thread_count': thread_count,
+                'reputation': (
+                    post_count * REPUTATION_PER_POST
+                    + thread_count * REPUTATION_PER_THREAD
+                    + likes * REPUTATION_PER_LIKE
+                ),
+            }
+
+        profiles = list(UserProfile.objects.filter(user_id__in=user_ids))
+        for profile in profiles:
+            for name, value in fields(profile.user_id).items():
+                setattr(profile, name, value)
+        existing = {profile.user_id for profile in profiles}
+        UserProfile.objects.bulk_update(profiles, ['post_count', 'thread_count', 'reputation'])
+        UserProfile.objects.bulk_create([
+            UserProfile(user_id=user_id, **fields(user_id))
+            for user_id in user_ids if user_id not in existing
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('forum', '0012_searchposting_term_tf_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_profile_stats, migrations.RunPython.noop),
+    ]
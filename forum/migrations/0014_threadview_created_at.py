@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0013_populate_user_profile_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='threadview',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
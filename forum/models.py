@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.conf import settings
 from django.utils import timezone
 from django.utils.text import slugify
@@ -12,6 +12,12 @@ class Category(models.Model):
     icon = models.CharField(max_length=50, blank=True, help_text="Icon class or emoji")
     order = models.IntegerField(default=0)
 
+    # Counters denormalized from Thread/Post, maintained by forum.signals
+    # and rebuilt with `manage.py rebuild_forum_counters`.
+    thread_count = models.PositiveIntegerField(default=0, editable=False)
+    post_count = models.PositiveIntegerField(default=0, editable=False)
+    last_post = models.ForeignKey('Post', null=True, blank=True, on_delete=models.SET_NULL, related_name='+', editable=False)
+
     class Meta:
         ordering = ['order', 'title']
         verbose_name_plural = "Categories"
@@ -37,14 +43,20 @@ class Category(models.Model):
         
         super().save(*args, **kwargs)
 
-    def thread_count(self):
-        return self.threads.count()
-
-    def post_count(self):
-        return Post.objects.filter(thread__category=self).count()
-
-    def latest_post(self):
-        return Post.objects.filter(thread__category=self).select_related('author', 'thread').order_by('-created_at').first()
+    @staticmethod
+    def latest_post_subquery():
+        """Subquery chọn id post mới nhất của category (dùng với OuterRef('pk'))."""
+        return models.Subquery(
+            Post.objects
+            .filter(thread__category=models.OuterRef('pk'))
+            .order_by('-created_at', '-pk')
+            .values('pk')[:1]
+        )
+
+    @classmethod
+    def with_last_post(cls):
+        """QuerySet đã join sẵn last_post + author + thread để render danh sách không bị N+1."""
+        return cls.objects.select_related('last_post__author', 'last_post__thread')
 
 class Thread(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="threads")
@@ -70,21 +82,46 @@ class Thread(models.Model):
     )
     prefix = models.CharField(max_length=20, choices=PREFIX_CHOICES, blank=True)
 
+    # Cột hoạt động denormalized, cập nhật bởi forum.signals khi tạo/xóa Post.
+    # reply_count không tính post mở đầu (số post = reply_count + 1).
+    # last_poster có thể NULL khi tài khoản người gửi post mới nhất đã bị xóa.
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+    last_post_at = models.DateTimeField(default=timezone.now, editable=False)
+    last_poster = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+', editable=False)
+    # Điểm trending đã decay theo thời gian, tính bởi `manage.py compute_trending`
+    trending_score = models.FloatField(default=0, db_index=True, editable=False)
+
     class Meta:
-        ordering = ['-pinned', '-updated_at']
+        ordering = ['-pinned', '-last_post_at']
+        indexes = [
+            models.Index(fields=['category', '-pinned', '-last_post_at'], name='forum_thread_cat_active_idx'),
+            models.Index(fields=['-last_post_at'], name='forum_thread_active_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
-    def post_count(self):
-        return self.posts.count()
-
-    def latest_post(self):
-        return self.posts.select_related('author').order_by('-created_at').first()
-
-    def increment_views(self):
-        self.views += 1
-        self.save(update_fields=['views'])
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Nhớ category lúc nạp để forum.signals nhận ra thread bị chuyển category
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        return instance
+
+    @staticmethod
+    def latest_post_subquery(field):
+        """Subquery lấy `field` của post mới nhất trong thread (dùng với OuterRef('pk'))."""
+        return models.Subquery(
+            Post.objects
+            .filter(thread=models.OuterRef('pk'))
+            .order_by('-created_at', '-pk')
+            .values(field)[:1]
+        )
+
+    def increment_views(self, count=1):
+        # UPDATE views = views + n: không mất lượt xem khi nhiều request ghi cùng lúc
+        Thread.objects.filter(pk=self.pk).update(views=models.F('views') + count)
+        self.views += count
 
 class Post(models.Model):
     thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name="posts")
@@ -93,7 +130,13 @@ class Post(models.Model):
     image = models.ImageField(upload_to='post_images/', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    likes = models.IntegerField(default=0)
+
+    # Số reaction theo loại, cập nhật bởi PostReaction.toggle và forum.signals
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    love_count = models.PositiveIntegerField(default=0, editable=False)
+    laugh_count = models.PositiveIntegerField(default=0, editable=False)
+    angry_count = models.PositiveIntegerField(default=0, editable=False)
+    sad_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['created_at']
@@ -101,6 +144,45 @@ class Post(models.Model):
     def __str__(self):
         return f"Post by {self.author} on {self.thread}"
 
+    @staticmethod
+    def reaction_field(reaction_type):
+        return f"{reaction_type}_count"
+
+    @classmethod
+    def reaction_fields(cls):
+        return [cls.reaction_field(t) for t, _ in PostReaction.REACTION_TYPES]
+
+    def reaction_counts(self):
+        return {t: getattr(self, self.reaction_field(t)) for t, _ in PostReaction.REACTION_TYPES}
+
+    def reaction_badges(self):
+        """[(emoji, count), ...] của các loại reaction đang có, để hiển thị."""
+        return [
+            (emoji, getattr(self, self.reaction_field(t)))
+            for t, emoji in PostReaction.REACTION_TYPES
+            if getattr(self, self.reaction_field(t))
+        ]
+
+    @classmethod
+    def adjust_reaction_counts(cls, post_id, deltas):
+        """UPDATE cột đếm theo deltas {reaction_type: +n / -n}, không để xuống dưới 0."""
+        cls.adjust_reaction_counts_many([post_id], deltas)
+
+    @classmethod
+    def adjust_reaction_counts_many(cls, post_ids, deltas):
+        """Như adjust_reaction_counts, cùng deltas cho nhiều post trong 1 UPDATE."""
+        updates = {}
+        for reaction_type, delta in deltas.items():
+            field = cls.reaction_field(reaction_type)
+            if delta >= 0:
+                updates[field] = models.F(field) + delta
+            else:
+                updates[field] = models.Case(
+                    models.When(**{f"{field}__gte": -delta}, then=models.F(field) + delta),
+                    default=models.Value(0),
+                )
+        cls.objects.filter(pk__in=post_ids).update(**updates)
+
 class PostReaction(models.Model):
     REACTION_TYPES = (
         ('like', '👍'),
@@ -118,6 +200,53 @@ class PostReaction(models.Model):
     class Meta:
         unique_together = ('post', 'user')
 
+    @classmethod
+    def lookup(cls, user, posts):
+        """{post_id: reaction_type} của user trên các post đang hiển thị (1 truy vấn)."""
+        if not user.is_authenticated:
+            return {}
+        return dict(
+            cls.objects.filter(user=user, post_id__in=[p.pk for p in posts])
+            .values_list('post_id', 'reaction_type')
+        )
+
+    @classmethod
+    def toggle(cls, post, user, reaction_type):
+        """
+        Thêm / bỏ / đổi reaction của user trên post. Trả về (action, counts).
+
+        Dòng reaction của user được khóa (SELECT ... FOR UPDATE) nên các click
+        đồng thời của cùng user chạy lần lượt; cột đếm trên Post được cập nhật
+        trong cùng transaction (thêm/xóa qua forum.signals, đổi loại ở đây).
+        """
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    existing = cls.objects.select_for_update().filter(post=post, user=user).first()
+                    if existing is None:
+                        cls.objects.create(post=post, user=user, reaction_type=reaction_type)
+                        action = 'added'
+                    elif existing.reaction_type == reaction_type:
+                        existing.delete()
+                        action = 'removed'
+                    else:
+                        old_type = existing.reaction_type
+                        existing.reaction_type = reaction_type
+                        existing.save(update_fields=['reaction_type'])
+                        Post.adjust_reaction_counts(post.pk, {old_type: -1, reaction_type: 1})
+                        UserProfile.adjust(post.author_id, reputation=UserProfile.REPUTATION_PER_LIKE * (
+                            (reaction_type == 'like') - (old_type == 'like')
+                        ))
+                        action = 'changed'
+                    row = Post.objects.filter(pk=post.pk).values(*Post.reaction_fields()).get()
+            except IntegrityError:
+                # Click khác của cùng user vừa tạo reaction trước -> chạy lại sẽ thấy dòng đó
+                if attempt:
+                    raise
+                continue
+            counts = {t: row[Post.reaction_field(t)] for t, _ in cls.REACTION_TYPES}
+            return action, counts
+
 class ProfilePost(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='profile_posts')
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='authored_profile_posts')
@@ -137,6 +266,7 @@ class Notification(models.Model):
         ('mention', 'Bạn được mention'),
         ('profile_post', 'Có người post lên profile của bạn'),
         ('thread_follow', 'Thread bạn theo dõi có bài mới'),
+        ('reaction', 'Có người react bài viết của bạn'),
     )
     
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
@@ -150,6 +280,10 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Đếm / lọc notification chưa đọc của user
+            models.Index(fields=['user', 'is_read'], name='forum_notif_user_read_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.notification_type}"
@@ -220,6 +354,8 @@ class UserProfile(models.Model):
     bio = models.TextField(blank=True, max_length=500)
     location = models.CharField(max_length=100, blank=True)
     website = models.URLField(blank=True)
+    # Điểm uy tín và số post/thread, cộng dần bởi forum.signals (xem REPUTATION_*);
+    # `manage.py recompute_reputation` / `reconcile_profile_counters` tính lại toàn bộ.
     reputation = models.IntegerField(default=0)
     post_count = models.IntegerField(default=0)
     thread_count = models.IntegerField(default=0)
@@ -227,15 +363,67 @@ class UserProfile(models.Model):
     last_activity = models.DateTimeField(default=timezone.now)
     signature = models.TextField(blank=True, max_length=200)
     avatar_url = models.URLField(blank=True)
+
+    REPUTATION_PER_POST = 2
+    REPUTATION_PER_THREAD = 10
+    REPUTATION_PER_LIKE = 5
     
     def __str__(self):
         return f"{self.user.username}'s profile"
+
+    @classmethod
+    def compute_reputation(cls, posts, threads, likes):
+        return (
+            posts * cls.REPUTATION_PER_POST
+            + threads * cls.REPUTATION_PER_THREAD
+            + likes * cls.REPUTATION_PER_LIKE
+        )
+
+    @classmethod
+    def activity_stats(cls, user_ids):
+        """{user_id: (số post, số thread, số like nhận được)} bằng 2 truy vấn gộp."""
+        stats = {user_id: [0, 0, 0] for user_id in user_ids}
+        for author_id, n, likes in (
+            Post.objects.filter(author_id__in=user_ids)
+            .values_list('author_id').annotate(n=models.Count('id'), likes=models.Sum('like_count')).order_by()
+        ):
+            stats[author_id][0], stats[author_id][2] = n, likes or 0
+        for author_id, n in (
+            Thread.objects.filter(author_id__in=user_ids)
+            .values_list('author_id').annotate(n=models.Count('id')).order_by()
+        ):
+            stats[author_id][1] = n
+        return {user_id: tuple(values) for user_id, values in stats.items()}
+
+    def apply_stats(self, posts, threads, likes):
+        """Gán post_count / thread_count / reputation từ số liệu của activity_stats()."""
+        self.post_count = posts
+        self.thread_count = threads
+        self.reputation = self.compute_reputation(posts, threads, likes)
+        return self
+
+    @classmethod
+    def adjust(cls, user_id, **deltas):
+        """UPDATE ... SET field = field + delta cho profile của user (atomic)."""
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not (user_id and deltas):
+            return
+        updated = cls.objects.filter(user_id=user_id).update(
+            **{field: models.F(field) + delta for field, delta in deltas.items()}
+        )
+        # Chưa có profile: tạo luôn với số liệu đếm từ DB (đã gồm thay đổi vừa ghi).
+        # Chỉ khi có hoạt động mới, không khi đang trừ (vd xóa dây chuyền lúc xóa user).
+        if not updated and any(delta > 0 for delta in deltas.values()):
+            try:
+                with transaction.atomic():
+                    cls(user_id=user_id).apply_stats(*cls.activity_stats([user_id])[user_id]).save(force_insert=True)
+            except IntegrityError:
+                # Process khác vừa tạo, cũng đếm từ DB
+                pass
     
     def update_counts(self):
-        from django.db.models import Count
-        self.thread_count = Thread.objects.filter(author=self.user).count()
-        self.post_count = Post.objects.filter(author=self.user).count()
-        self.save(update_fields=['thread_count', 'post_count'])
+        self.apply_stats(*self.activity_stats([self.user_id])[self.user_id])
+        self.save(update_fields=['thread_count', 'post_count', 'reputation'])
     
     def get_rank(self):
         if self.reputation >= 10000:
@@ -257,9 +445,85 @@ class ThreadView(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     viewed_at = models.DateTimeField(default=timezone.now)
+    # Thời điểm dòng được ghi xuống DB (viewed_at có thể cũ hơn nhiều nếu view_buffer
+    # flush lại sau lỗi) -> rollup dựa vào cột này để biết dòng đã "ổn định" chưa
+    created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-viewed_at']
     
     def __str__(self):
         return f"View on {self.thread.title}"
+
+
+class ThreadViewDaily(models.Model):
+    """Tổng hợp ThreadView theo ngày (điền bởi `manage.py rollup_thread_views`)."""
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='daily_views')
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    unique_viewers = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('thread', 'date')
+        indexes = [
+            models.Index(fields=['date', 'thread'], name='forum_tvdaily_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.thread_id} {self.date}: {self.views}"
+
+
+class RollupWatermark(models.Model):
+    """Vị trí (id) cuối cùng mà một job rollup đã xử lý."""
+    THREAD_VIEWS = 'thread_views_daily'
+
+    name = models.CharField(max_length=50, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
+
+
+# ============================================================================
+# FULL-TEXT SEARCH (inverted index, xem forum/search_engine.py)
+# ============================================================================
+
+class SearchTerm(models.Model):
+    term = models.CharField(max_length=64, unique=True)
+
+    def __str__(self):
+        return self.term
+
+
+class SearchDocument(models.Model):
+    """1 document = tiêu đề của thread (post=None) hoặc nội dung 1 post."""
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='search_documents')
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, null=True, blank=True, related_name='search_document')
+    # Denormalized để lọc theo category/author/ngày mà không cần join
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+    length = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'created_at'], name='forum_searchdoc_cat_idx'),
+            models.Index(fields=['author', 'created_at'], name='forum_searchdoc_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"Search document {self.thread_id}/{self.post_id}"
+
+
+class SearchPosting(models.Model):
+    term = models.ForeignKey(SearchTerm, on_delete=models.CASCADE, related_name='postings')
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name='postings')
+    tf = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('term', 'document')
+        indexes = [
+            # search(): posting của 1 term theo tf giảm dần (top-k ổn định)
+            models.Index(fields=['term', '-tf', 'document'], name='forum_searchpost_term_tf_idx'),
+        ]
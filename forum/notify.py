@@ -0,0 +1,129 @@
+"""
+Gửi notification cho người theo dõi thread ở nền (fan-out).
+
+thread_detail chỉ gọi queue_reply() -> job được đưa vào hàng đợi sau khi
+transaction commit, request trả về ngay. Worker nền xử lý từng job:
+  - đọc ThreadFollow theo lô FORUM_NOTIFY_CHUNK_SIZE (seek theo pk, chỉ lấy user_id)
+  - bỏ qua user đã có notification chưa đọc cho thread đó
+  - ghi Notification bằng bulk_create, cộng bộ đếm chưa đọc (forum.unread)
+Khi process tắt (atexit) các job còn lại được xử lý nốt.
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import unread
+
+logger = logging.getLogger(__name__)
+
+_jobs = queue.Queue()
+_lock = threading.Lock()
+_worker = None
+
+
+def _chunk_size():
+    return getattr(settings, "FORUM_NOTIFY_CHUNK_SIZE", 500)
+
+
+def queue_reply(post):
+    """Xếp hàng job báo cho follower của post.thread (sau khi commit)."""
+    job = (post.thread_id, post.pk, post.author_id, post.thread.title)
+    transaction.on_commit(lambda: _enqueue(job))
+
+
+def _enqueue(job):
+    _ensure_worker()
+    _jobs.put(job)
+
+
+def fan_out_reply(thread_id, post_id, sender_id, thread_title):
+    """Tạo notification 'thread_follow' cho mọi follower. Trả về số notification đã tạo."""
+    from .models import Post, ThreadFollow, Notification
+
+    # Post có thể đã bị xóa trong lúc job nằm trong hàng đợi
+    if not Post.objects.filter(pk=post_id).exists():
+        return 0
+
+    chunk_size = _chunk_size()
+    message = f"Thread bạn theo dõi có bài mới: {thread_title}"[:255]
+    created = 0
+    last_pk = 0
+    while True:
+        rows = list(
+            ThreadFollow.objects
+            .filter(thread_id=thread_id, pk__gt=last_pk)
+            .exclude(user_id=sender_id)
+            .order_by('pk')
+            .values_list('pk', 'user_id')[:chunk_size]
+        )
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        user_ids = [user_id for _, user_id in rows]
+
+        already = set(
+            Notification.objects
+            .filter(thread_id=thread_id, is_read=False, user_id__in=user_ids)
+            .values_list('user_id', flat=True)
+        )
+        batch = [
+            Notification(
+                user_id=user_id,
+                notification_type='thread_follow',
+                sender_id=sender_id,
+                thread_id=thread_id,
+                post_id=post_id,
+                message=message,
+            )
+            for user_id in user_ids if user_id not in already
+        ]
+        Notification.objects.bulk_create(batch, batch_size=chunk_size)
+        # bulk_create không gửi signal -> tự cập nhật bộ đếm chưa đọc
+        unread.incr_many(n.user_id for n in batch)
+        created += len(batch)
+    return created
+
+
+def drain():
+    """Xử lý hết các job đang chờ (dùng khi tắt process)."""
+    while True:
+        try:
+            job = _jobs.get_nowait()
+        except queue.Empty:
+            return
+        _process(job)
+
+
+def _process(job):
+    try:
+        fan_out_reply(*job)
+    except Exception:
+        logger.exception("Không gửi được notification cho thread %s", job[0])
+
+
+# ============================================================================
+# WORKER NỀN
+# ============================================================================
+
+def _run():
+    while True:
+        job = _jobs.get()
+        close_old_connections()
+        _process(job)
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None:
+        return
+    with _lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name="forum-notify", daemon=True)
+            _worker.start()
+
+
+atexit.register(drain)
@@ -0,0 +1,167 @@
+"""
+Cache nguyên trang cho khách (home, category, thread).
+
+Khóa = đường dẫn đầy đủ (kể cả query string) + version nội dung của trang
+(category_tree.version(), versioning.category_version / thread_version), nên
+khi nội dung đổi thì entry cũ tự bị bỏ qua; FORUM_PAGE_CACHE_TIMEOUT chỉ là
+giới hạn cho phần không có version (lượt xem, thống kê).
+
+Phần riêng của người xem (header, badge thông báo, nút tạo bài, ...) là các
+"hole" khai báo trong HOLES và đặt trong template bằng {% page_hole "tên" %}:
+  - render bình thường: hole được render tại chỗ như {% include %}
+  - render để cache ("shell"): hole chỉ để lại marker <!--page-hole:tên-->,
+    mỗi lần trả trang marker được thay bằng hole render cho người đang xem.
+Template của hole chỉ được phụ thuộc vào người xem (request.user).
+
+Với shell=True trang dùng chung 1 shell cho cả user đã đăng nhập; mặc định
+chỉ khách được phục vụ từ cache, user đăng nhập render trực tiếp.
+"""
+import hashlib
+import re
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_vary_headers
+from django.utils.safestring import mark_safe
+
+HOLES = {
+    'user_actions': 'holes/user_actions.html',
+    'admin_link': 'holes/admin_link.html',
+    'mobile_user_menu': 'holes/mobile_user_menu.html',
+    'create_thread_button': 'forum/holes/create_thread_button.html',
+    'create_first_thread': 'forum/holes/create_first_thread.html',
+}
+
+_HOLE_RE = re.compile(rb'<!--page-hole:(\w+)-->')
+
+
+def _timeout():
+    return getattr(settings, 'FORUM_PAGE_CACHE_TIMEOUT', 600)
+
+
+def _cache():
+    return caches[getattr(settings, 'FORUM_PAGE_CACHE_ALIAS', 'default')]
+
+
+def _key(request, version):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"forum:page:{path}:{version}"
+
+
+def _is_anonymous(request):
+    # Không có cookie session -> chắc chắn là khách, khỏi phải đọc session
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return True
+    return not request.user.is_authenticated
+
+
+# ============================================================================
+# HOLES
+# ============================================================================
+
+def render_hole(request, name):
+    """Dùng trong {% page_hole %}: marker khi đang dựng shell, ngược lại render luôn."""
+    if getattr(request, 'page_shell', False):
+        return mark_safe(f'<!--page-hole:{name}-->')
+    return render_to_string(HOLES[name], request=request)
+
+
+def fill_holes(request, content):
+    """Thay các marker trong `content` (bytes) bằng hole render cho request này."""
+    rendered = {}
+
+    def replace(match):
+        name = match.group(1).decode()
+        if name not in HOLES:
+            return match.group(0)
+        if name not in rendered:
+            rendered[name] = render_to_string(HOLES[name], request=request).encode()
+        return rendered[name]
+
+    return _HOLE_RE.sub(replace, content)
+
+
+# ============================================================================
+# DECORATOR
+# ============================================================================
+
+def _storable(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # Trang có CSRF token là trang riêng của từng client
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and 'private' not in response.get('Cache-Control', '')
+    )
+
+
+def _respond(request, key, entry, anonymous):
+    if anonymous:
+        if entry['anonymous'] is None:
+            # Shell do user đăng nhập dựng: bản cho khách chỉ cần fill 1 lần
+            entry['anonymous'] = fill_holes(request, entry['shell'])
+            _cache().set(key, entry, _timeout())
+        content = entry['anonymous']
+    else:
+        content = fill_holes(request, entry['shell'])
+    response = HttpResponse(content, content_type=entry['content_type'])
+    response['X-Page-Cache'] = 'hit'
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def anonymous_page_cache(version, shell=False, on_hit=None):
+    """
+    Cache response GET của view theo version(request, *args, **kwargs).
+    version trả về None -> không dùng cache cho request đó.
+    on_hit(request, *args, **kwargs) chạy khi trả trang từ cache (vd ghi lượt xem).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not _timeout():
+                return view(request, *args, **kwargs)
+            anonymous = _is_anonymous(request)
+            if not (anonymous or shell):
+                return view(request, *args, **kwargs)
+            current = version(request, *args, **kwargs)
+            if current is None:
+                return view(request, *args, **kwargs)
+
+            key = _key(request, current)
+            entry = _cache().get(key)
+            if entry is not None:
+                if on_hit is not None:
+                    on_hit(request, *args, **kwargs)
+                return _respond(request, key, entry, anonymous)
+
+            # Shell luôn được dựng như cho khách để phần riêng của user không lọt vào cache
+            user = request.user
+            request.user, request.page_shell = AnonymousUser(), True
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                request.user, request.page_shell = user, False
+            if response.streaming:
+                return response
+
+            # Kiểm tra trước khi fill: hole render cho user có thể dùng CSRF token
+            storable = _storable(request, response)
+            shell_content = response.content
+            response.content = fill_holes(request, shell_content)
+            if storable:
+                _cache().set(key, {
+                    'content_type': response['Content-Type'],
+                    'shell': shell_content,
+                    'anonymous': response.content if anonymous else None,
+                }, _timeout())
+                response['X-Page-Cache'] = 'miss'
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
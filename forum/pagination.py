@@ -0,0 +1,196 @@
+"""
+Keyset (seek) pagination: thay cho Paginator + OFFSET ở các trang danh sách dài.
+
+- Trang kế/trước được tìm bằng WHERE (k1, k2, ...) < / > (giá trị của dòng biên)
+  theo đúng thứ tự ORDER BY, nên trang sâu cũng nhanh như trang đầu (dùng index).
+- Cursor là chuỗi ký bằng django.core.signing (opaque, không sửa tay được),
+  chứa giá trị khóa của dòng biên + số trang.
+- ?page=N vẫn dùng được: cursor đầu mỗi trang được cache theo `cache_key`;
+  nếu chưa có thì tìm dòng biên bằng 1 truy vấn OFFSET chỉ đọc cột khóa rồi cache lại.
+- count (tổng số dòng) nên truyền vào từ counter sẵn có để khỏi COUNT(*).
+"""
+import math
+from datetime import datetime
+
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+
+CURSOR_SALT = 'forum.pagination'
+PAGE_CURSOR_TTL = 60 * 10
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _encode_value(value):
+    return {'dt': value.isoformat()} if isinstance(value, datetime) else value
+
+
+def _decode_value(value):
+    return datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value
+
+
+class KeysetPage:
+    def __init__(self, paginator, object_list, number, has_previous, has_next):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.number = number
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self.paginator.make_cursor(self.object_list[0], self.number - 1, before=True)
+
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.make_cursor(self.object_list[-1], self.number + 1)
+
+
+class KeysetPaginator:
+    """
+    ordering: các field để seek, field cuối phải unique (vd 'id'),
+              vd ('-pinned', '-last_post_at', '-id') hoặc ('created_at', 'id').
+    """
+
+    def __init__(self, queryset, per_page, ordering, count=None, cache_key=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.fields = [f.lstrip('-') for f in self.ordering]
+        self._count = count
+        self.cache_key = cache_key
+
+    # --- tổng số dòng / số trang -------------------------------------------
+
+    @property
+    def count(self):
+        if self._count is None:
+            self._count = self.queryset.count()
+        return self._count
+
+    @property
+    def num_pages(self):
+        return max(1, math.ceil(self.count / self.per_page))
+
+    # --- cursor ---------------------------------------------------------------
+
+    def make_cursor(self, obj, number, before=False):
+        values = [_encode_value(getattr(obj, f)) for f in self.fields]
+        cursor = signing.dumps({'k': values, 'n': number, 'b': before}, salt=CURSOR_SALT, compress=True)
+        if not before:
+            self._remember(number, values)
+        return cursor
+
+    def _decode(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            values = [_decode_value(v) for v in data['k']]
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise InvalidCursor(cursor)
+        if len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        return values, data['n'], data['b']
+
+    def _remember(self, number, values):
+        if self.cache_key and number > 1:
+            cache.set(f"{self.cache_key}:{number}", values, PAGE_CURSOR_TTL)
+
+    # --- seek -----------------------------------------------------------------
+
+    def _seek(self, values, before):
+        """Q cho các dòng đứng sau (hoặc trước nếu before) bộ giá trị khóa `values`."""
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            name = self.fields[i]
+            descending = field.startswith('-')
+            lookup = 'gt' if descending == before else 'lt'
+            step = Q(**{f"{name}__{lookup}": values[i]})
+            for prev_name, prev_value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return [f[1:] if f.startswith('-') else f'-{f}' for f in self.ordering]
+
+    def _fetch(self, values=None, before=False):
+        qs = self.queryset
+        if values is not None:
+            qs = qs.filter(self._seek(values, before))
+        qs = qs.order_by(*(self._reversed_ordering() if before else self.ordering))
+        rows = list(qs[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if before:
+            rows.reverse()
+        return rows, more
+
+    def _page_start_values(self, number):
+        """Giá trị khóa của dòng cuối trang number-1 (cache, nếu không có thì 1 lần OFFSET)."""
+        if self.cache_key:
+            values = cache.get(f"{self.cache_key}:{number}")
+            if values is not None:
+                return [_decode_value(v) for v in values]
+        offset = (number - 1) * self.per_page - 1
+        row = self.queryset.order_by(*self.ordering).values_list(*self.fields)[offset:offset + 1].first()
+        if row is None:
+            return None
+        self._remember(number, [_encode_value(v) for v in row])
+        return list(row)
+
+    # --- API ------------------------------------------------------------------
+
+    def page(self, cursor=None, number=None):
+        if cursor:
+            values, number, before = self._decode(cursor)
+            rows, more = self._fetch(values, before)
+            if before:
+                return KeysetPage(self, rows, number, has_previous=more, has_next=True)
+            return KeysetPage(self, rows, number, has_previous=True, has_next=more)
+
+        number = min(max(int(number or 1), 1), self.num_pages)
+        values = self._page_start_values(number) if number > 1 else None
+        if number > 1 and values is None:
+            number, values = 1, None
+        rows, more = self._fetch(values)
+        return KeysetPage(self, rows, number, has_previous=number > 1, has_next=more)
+
+    def page_from_request(self, request):
+        """Đọc ?cursor=... (ưu tiên) hoặc ?page=N, 'last' = trang cuối."""
+        cursor = request.GET.get('cursor')
+        if cursor:
+            try:
+                return self.page(cursor=cursor)
+            except InvalidCursor:
+                pass
+        number = request.GET.get('page')
+        if number == 'last':
+            number = self.num_pages
+        try:
+            number = int(number or 1)
+        except (TypeError, ValueError):
+            number = 1
+        return self.page(number=number)
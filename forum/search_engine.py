@@ -0,0 +1,288 @@
+"""
+Tìm kiếm full-text cho diễn đàn bằng inverted index trong chính database.
+
+- tokenize(): bỏ HTML, gấp dấu tiếng Việt bằng unidecode ("điện thoại" -> "dien thoai")
+- Index: SearchTerm (từ) -> SearchPosting (term, document, tf) -> SearchDocument
+  (tiêu đề thread hoặc nội dung post). Cập nhật bởi forum.signals khi lưu Thread/Post;
+  term không còn posting được dọn bởi `rebuild_search_index --prune-terms`.
+- Xếp hạng BM25, lọc theo category / tác giả / khoảng ngày. Từ quá phổ biến
+  (stopword) bị bỏ qua khi query còn từ khác.
+
+Chạy được trên SQLite và MySQL, không cần search server bên ngoài.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, Exists, OuterRef
+from django.utils.html import strip_tags
+from unidecode import unidecode
+
+from .models import Post, SearchDocument, SearchPosting, SearchTerm
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+MAX_TERM_LENGTH = 64
+# Không coi là stopword nếu df dưới ngưỡng này (corpus nhỏ: tỉ lệ df/N không có nghĩa)
+STOPWORD_MIN_DF = 1000
+STATS_CACHE_KEY = 'forum_search_stats'
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Chuỗi -> danh sách token ASCII chữ thường (đã bỏ dấu)."""
+    if not text:
+        return []
+    folded = unidecode(strip_tags(text)).lower()
+    return [t for t in _TOKEN_RE.findall(folded) if len(t) <= MAX_TERM_LENGTH]
+
+
+# ============================================================================
+# INDEXING
+# ============================================================================
+
+def _term_ids(terms):
+    """{term: id}, tạo SearchTerm còn thiếu bằng bulk_create."""
+    terms = list(terms)
+    ids = {}
+    for i in range(0, len(terms), 500):
+        chunk = terms[i:i + 500]
+        ids.update(SearchTerm.objects.filter(term__in=chunk).values_list('term', 'pk'))
+        missing = [t for t in chunk if t not in ids]
+        if missing:
+            SearchTerm.objects.bulk_create([SearchTerm(term=t) for t in missing], ignore_conflicts=True)
+            ids.update(SearchTerm.objects.filter(term__in=missing).values_list('term', 'pk'))
+    return ids
+
+
+def _write_postings(documents_with_tf):
+    """Ghi lại postings cho các document (đã có pk) theo Counter tf tương ứng."""
+    term_ids = _term_ids(set().union(*(tf for _, tf in documents_with_tf)) if documents_with_tf else ())
+    SearchPosting.objects.filter(document__in=[doc for doc, _ in documents_with_tf]).delete()
+    SearchPosting.objects.bulk_create(
+        [
+            SearchPosting(term_id=term_ids[term], document=doc, tf=count)
+            for doc, tf in documents_with_tf
+            for term, count in tf.items()
+        ],
+        batch_size=1000,
+    )
+
+
+def index_thread(thread):
+    """Index (lại) tiêu đề thread và đồng bộ category của các document thuộc thread."""
+    tf = Counter(tokenize(thread.title))
+    with transaction.atomic():
+        SearchDocument.objects.filter(thread=thread).exclude(category_id=thread.category_id).update(
+            category_id=thread.category_id
+        )
+        doc, _ = SearchDocument.objects.update_or_create(
+            thread=thread, post=None,
+            defaults={
+                'category_id': thread.category_id,
+                'author_id': thread.author_id,
+                'created_at': thread.created_at,
+                'length': sum(tf.values()),
+            },
+        )
+        _write_postings([(doc, tf)])
+
+
+def index_post(post, category_id=None):
+    """Index (lại) nội dung 1 post."""
+    if category_id is None:
+        category_id = post.thread.category_id
+    tf = Counter(tokenize(post.content))
+    with transaction.atomic():
+        doc, _ = SearchDocument.objects.update_or_create(
+            post=post,
+            defaults={
+                'thread_id': post.thread_id,
+                'category_id': category_id,
+                'author_id': post.author_id,
+                'created_at': post.created_at,
+                'length': sum(tf.values()),
+            },
+        )
+        _write_postings([(doc, tf)])
+
+
+def index_posts_bulk(posts):
+    """Index nhiều post một lượt (dùng cho rebuild_search_index). posts cần select_related('thread')."""
+    posts = list(posts)
+    if not posts:
+        return
+    tfs = {p.pk: Counter(tokenize(p.content)) for p in posts}
+    with transaction.atomic():
+        SearchDocument.objects.filter(post__in=posts).delete()
+        SearchDocument.objects.bulk_create([
+            SearchDocument(
+                thread_id=p.thread_id, post=p, category_id=p.thread.category_id,
+                author_id=p.author_id, created_at=p.created_at, length=sum(tfs[p.pk].values()),
+            )
+            for p in posts
+        ])
+        # bulk_create trên MySQL không trả về pk -> đọc lại
+        docs = SearchDocument.objects.filter(post__in=posts)
+        _write_postings([(doc, tfs[doc.post_id]) for doc in docs])
+
+
+def prune_terms(chunk_size=1000):
+    """
+    Xóa SearchTerm không còn posting nào (document bị xóa theo Post/Thread thì
+    posting đi theo, còn term thì ở lại). Trả về số term đã xóa.
+    """
+    pruned = 0
+    last_pk = 0
+    while True:
+        ids = list(
+            SearchTerm.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return pruned
+        last_pk = ids[-1]
+        used = set(SearchPosting.objects.filter(term_id__in=ids).values_list('term_id', flat=True).distinct())
+        unused = [term_id for term_id in ids if term_id not in used]
+        if unused:
+            # Kiểm tra lại trong lúc xóa: term có thể vừa được index_post dùng tới
+            pruned += SearchTerm.objects.filter(pk__in=unused).exclude(
+                Exists(SearchPosting.objects.filter(term_id=OuterRef('pk')))
+            ).delete()[0]
+
+
+# ============================================================================
+# QUERY
+# ============================================================================
+
+def corpus_stats():
+    """(số document, độ dài trung bình), cache vài phút vì chỉ dùng cho BM25."""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        agg = SearchDocument.objects.aggregate(n=Count('id'), avgdl=Avg('length'))
+        stats = (agg['n'] or 0, float(agg['avgdl'] or 0.0))
+        cache.set(STATS_CACHE_KEY, stats, 60 * 10)
+    return stats
+
+
+class SearchResults(list):
+    """
+    Hit đã xếp hạng [(score, thread_id, post_id), ...] kèm thông tin cho view:
+      - truncated: số posting vượt FORUM_SEARCH_MAX_POSTINGS, kết quả chưa đầy đủ
+      - ignored_terms: từ quá phổ biến bị bỏ qua khi xếp hạng
+    """
+
+    def __init__(self, hits=(), truncated=False, ignored_terms=()):
+        super().__init__(hits)
+        self.truncated = truncated
+        self.ignored_terms = list(ignored_terms)
+
+
+def _stopword_df(n_docs):
+    """Từ xuất hiện trong nhiều document hơn ngưỡng này được coi là stopword ("la", "cua", "va")."""
+    ratio = getattr(settings, 'FORUM_SEARCH_STOPWORD_RATIO', 0.2)
+    return max(n_docs * ratio, STOPWORD_MIN_DF)
+
+
+def search(query, category=None, author=None, since=None, until=None):
+    """
+    Trả về SearchResults: danh sách hit đã xếp hạng [(score, thread_id, post_id), ...]
+    (post_id=None nghĩa là khớp tiêu đề thread).
+
+    Từ hiếm được đọc trước. Stopword bị bỏ qua nếu query còn từ khác; nếu query
+    toàn stopword thì mỗi từ chỉ lấy phần posting có tf cao nhất. Posting luôn
+    được đọc theo (tf giảm dần, document), nên khi bị cắt ở
+    FORUM_SEARCH_MAX_POSTINGS kết quả vẫn ổn định và giữ các document điểm cao.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return SearchResults()
+    term_names = dict(SearchTerm.objects.filter(term__in=terms).values_list('pk', 'term'))
+    if not term_names:
+        return SearchResults()
+
+    n_docs, avgdl = corpus_stats()
+    doc_freq = dict(
+        SearchPosting.objects.filter(term_id__in=term_names)
+        .values_list('term_id').annotate(n=Count('id')).order_by()
+    )
+    if not doc_freq:
+        # SearchTerm còn nhưng posting đã bị xóa theo document (xem prune_terms)
+        return SearchResults()
+    idf = {
+        term_id: math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        for term_id, df in doc_freq.items()
+    }
+
+    by_rarity = sorted(doc_freq, key=lambda term_id: (doc_freq[term_id], term_id))
+    stopword_df = _stopword_df(n_docs)
+    selected = [term_id for term_id in by_rarity if doc_freq[term_id] <= stopword_df]
+    all_stopwords = not selected
+    if all_stopwords:
+        selected, ignored = by_rarity, []
+    else:
+        ignored = sorted(term_names[term_id] for term_id in by_rarity if term_id not in selected)
+
+    postings = SearchPosting.objects.all()
+    if category is not None:
+        postings = postings.filter(document__category=category)
+    if author is not None:
+        postings = postings.filter(document__author=author)
+    if since is not None:
+        postings = postings.filter(document__created_at__gte=since)
+    if until is not None:
+        postings = postings.filter(document__created_at__lt=until)
+
+    limit = getattr(settings, 'FORUM_SEARCH_MAX_POSTINGS', 50000)
+    # Toàn stopword: chia đều ngân sách cho từng từ thay vì để từ đầu tiên dùng hết
+    per_term = max(limit // len(selected), 1) if all_stopwords else limit
+    scores = defaultdict(float)
+    docs = {}
+    truncated = False
+    remaining = limit
+    for term_id in selected:
+        budget = min(per_term, remaining)
+        if budget <= 0:
+            truncated = True
+            break
+        rows = list(
+            postings.filter(term_id=term_id)
+            .order_by('-tf', 'document_id')
+            .values_list('document_id', 'tf', 'document__length', 'document__thread_id', 'document__post_id')
+            [:budget]
+        )
+        remaining -= len(rows)
+        if len(rows) == budget and doc_freq[term_id] > budget:
+            truncated = True
+        for doc_id, tf, length, thread_id, post_id in rows:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avgdl) if avgdl else BM25_K1
+            scores[doc_id] += idf.get(term_id, 0.0) * tf * (BM25_K1 + 1) / (tf + norm)
+            docs[doc_id] = (thread_id, post_id)
+
+    hits = sorted(
+        ((score, *docs[doc_id]) for doc_id, score in scores.items()),
+        key=lambda hit: (-hit[0], hit[1], hit[2] or 0),
+    )
+    return SearchResults(hits, truncated=truncated, ignored_terms=ignored)
+
+
+def thread_hits(hits):
+    """Gộp hit theo thread (điểm cao nhất của thread), giữ thứ tự xếp hạng."""
+    seen = {}
+    for score, thread_id, _ in hits:
+        seen.setdefault(thread_id, score)
+    return list(seen)
+
+
+def post_hits(hits):
+    return [post_id for _, _, post_id in hits if post_id is not None]
+
+
+def load_posts(post_ids):
+    """Nạp Post theo đúng thứ tự post_ids."""
+    posts = Post.objects.select_related('author', 'thread', 'thread__category').in_bulk(post_ids)
+    return [posts[pk] for pk in post_ids if pk in posts]
@@ -0,0 +1,502 @@
+"""
+Signal handlers giữ cho các cột đếm denormalized luôn đúng khi ghi dữ liệu.
+"""
+from collections import defaultdict
+
+from django.db.models import F, Q, Case, When, Exists, Value, Count, Sum, PositiveIntegerField, QuerySet
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.db import transaction
+from django.contrib.auth import get_user_model
+
+from .models import Category, Thread, Post, PostReaction, Notification, UserProfile
+from . import search_engine, category_tree, unread, events
+from .versioning import bump_thread_version, bump_category_version
+
+User = get_user_model()
+
+IN_CHUNK_SIZE = 500
+
+
+def _post_category_id(post):
+    # Tránh thêm 1 query khi view đã gán sẵn post.thread
+    if Post.thread.is_cached(post):
+        return post.thread.category_id
+    return Thread.objects.filter(pk=post.thread_id).values_list('category_id', flat=True).first()
+
+
+def _minus(field, n):
+    """field - n, không xuống dưới 0."""
+    return Case(
+        When(**{f"{field}__gte": n}, then=F(field) - n),
+        default=Value(0),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), IN_CHUNK_SIZE):
+        yield ids[i:i + IN_CHUNK_SIZE]
+
+
+def _origin_model(kwargs):
+    # pre_delete / post_delete có `origin`: instance hoặc QuerySet đã gọi delete()
+    origin = kwargs.get('origin')
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+def _cascaded(kwargs):
+    """
+    Post / PostReaction / Notification bị xóa dây chuyền theo Thread, User hoặc
+    Category: counter đã được trừ theo nhóm ở pre_delete (mục XÓA DÂY CHUYỀN).
+    """
+    return issubclass(_origin_model(kwargs), (Thread, User, Category))
+
+
+def _deleted_with_author(kwargs):
+    """Thread bị xóa theo tài khoản tác giả: user_deleting đã xử lý theo nhóm."""
+    return issubclass(_origin_model(kwargs), User)
+
+
+# ============================================================================
+# CATEGORY COUNTERS + THREAD ACTIVITY + REACTION COUNTS
+# ============================================================================
+
+@receiver(post_save, sender=Thread)
+def thread_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Category.objects.filter(pk=instance.category_id).update(thread_count=F('thread_count') + 1)
+
+
+@receiver(post_delete, sender=Thread)
+def thread_deleted(sender, instance, **kwargs):
+    if _deleted_with_author(kwargs):
+        return
+    Category.objects.filter(pk=instance.category_id, thread_count__gt=0).update(thread_count=F('thread_count') - 1)
+    # Post của thread không trừ từng dòng (thread_deleting) -> chọn lại last_post nếu đã bị SET_NULL
+    Category.objects.filter(pk=instance.category_id, last_post__isnull=True).update(
+        last_post=Category.latest_post_subquery()
+    )
+
+
+@receiver(post_save, sender=Thread)
+def thread_moved(sender, instance, created, raw=False, **kwargs):
+    # Chuyển thread sang category khác: chuyển luôn counter + chọn lại last_post cả 2 bên
+    old_category_id = getattr(instance, '_loaded_category_id', None)
+    instance._loaded_category_id = instance.category_id
+    if created or raw or old_category_id is None or old_category_id == instance.category_id:
+        return
+
+    posts = Post.objects.filter(thread_id=instance.pk).count()
+    Category.objects.filter(pk=old_category_id).update(
+        thread_count=_minus('thread_count', 1),
+        post_count=_minus('post_count', posts),
+    )
+    Category.objects.filter(pk=instance.category_id).update(
+        thread_count=F('thread_count') + 1,
+        post_count=F('post_count') + posts,
+    )
+    Category.objects.filter(pk__in=[old_category_id, instance.category_id]).update(
+        last_post=Category.latest_post_subquery()
+    )
+    _bump_category(old_category_id)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    category_id = _post_category_id(instance)
+    Category.objects.filter(pk=category_id).update(
+        post_count=F('post_count') + 1,
+        last_post=instance,
+    )
+    Thread.objects.filter(pk=instance.thread_id).update(
+        # Post mở đầu (thread chưa có post nào khác) không tính là reply
+        reply_count=Case(
+            When(
+                Exists(Post.objects.filter(thread_id=instance.thread_id).exclude(pk=instance.pk)),
+                then=F('reply_count') + 1,
+            ),
+            default=F('reply_count'),
+            output_field=PositiveIntegerField(),
+        ),
+        last_post_at=instance.created_at,
+        last_poster_id=instance.author_id,
+        updated_at=timezone.now(),
+    )
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    if _cascaded(kwargs):
+        return
+    category_id = _post_category_id(instance)
+    if category_id is None:
+        return
+    Category.objects.filter(pk=category_id, post_count__gt=0).update(post_count=F('post_count') - 1)
+    # last_post đã bị SET_NULL nếu chính post này là post mới nhất -> chọn lại
+    Category.objects.filter(pk=category_id, last_post__isnull=True).update(
+        last_post=Category.latest_post_subquery()
+    )
+
+    Thread.objects.filter(pk=instance.thread_id, reply_count__gt=0).update(reply_count=F('reply_count') - 1)
+    # Chỉ cần tìm lại post mới nhất khi post bị xóa chính là post mới nhất
+    Thread.objects.filter(pk=instance.thread_id, last_post_at__lte=instance.created_at).update(
+        last_post_at=Coalesce(Thread.latest_post_subquery('created_at'), F('created_at')),
+        last_poster=Thread.latest_post_subquery('author'),
+    )
+
+
+@receiver(post_save, sender=PostReaction)
+def reaction_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Post.adjust_reaction_counts(instance.post_id, {instance.reaction_type: 1})
+
+
+@receiver(post_delete, sender=PostReaction)
+def reaction_deleted(sender, instance, **kwargs):
+    if _cascaded(kwargs):
+        return
+    Post.adjust_reaction_counts(instance.post_id, {instance.reaction_type: -1})
+
+
+# ============================================================================
+# USER PROFILE COUNTERS + REPUTATION
+# ============================================================================
+# Xóa lẻ hoặc QuerySet.delete() trên Post / PostReaction được trừ từng dòng ở
+# post_delete; xóa dây chuyền theo Thread / User được trừ theo nhóm ở mục
+# XÓA DÂY CHUYỀN bên dưới.
+
+def _reaction_post_author_id(reaction):
+    if PostReaction.post.is_cached(reaction):
+        return reaction.post.author_id
+    return Post.objects.filter(pk=reaction.post_id).values_list('author_id', flat=True).first()
+
+
+@receiver(post_save, sender=Thread)
+def thread_profile_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserProfile.adjust(instance.author_id, thread_count=1, reputation=UserProfile.REPUTATION_PER_THREAD)
+
+
+@receiver(post_delete, sender=Thread)
+def thread_profile_counters_removed(sender, instance, **kwargs):
+    if _deleted_with_author(kwargs):
+        return
+    UserProfile.adjust(instance.author_id, thread_count=-1, reputation=-UserProfile.REPUTATION_PER_THREAD)
+
+
+@receiver(post_save, sender=Post)
+def post_profile_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserProfile.adjust(instance.author_id, post_count=1, reputation=UserProfile.REPUTATION_PER_POST)
+
+
+@receiver(post_delete, sender=Post)
+def post_profile_counters_removed(sender, instance, **kwargs):
+    if _cascaded(kwargs):
+        return
+    UserProfile.adjust(instance.author_id, post_count=-1, reputation=-UserProfile.REPUTATION_PER_POST)
+
+
+@receiver(post_save, sender=PostReaction)
+def like_reputation(sender, instance, created, raw=False, **kwargs):
+    # Đổi loại reaction (created=False) do PostReaction.toggle tự cộng/trừ
+    if created and not raw and instance.reaction_type == 'like':
+        UserProfile.adjust(_reaction_post_author_id(instance), reputation=UserProfile.REPUTATION_PER_LIKE)
+
+
+@receiver(post_delete, sender=PostReaction)
+def like_reputation_removed(sender, instance, **kwargs):
+    if instance.reaction_type == 'like' and not _cascaded(kwargs):
+        UserProfile.adjust(_reaction_post_author_id(instance), reputation=-UserProfile.REPUTATION_PER_LIKE)
+
+
+# ============================================================================
+# SEARCH INDEX
+# ============================================================================
+
+def _touches(update_fields, fields):
+    return update_fields is None or bool(set(update_fields) & fields)
+
+
+@receiver(post_save, sender=Thread)
+def thread_reindex(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and _touches(update_fields, {'title', 'category'}):
+        search_engine.index_thread(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_reindex(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and _touches(update_fields, {'content'}):
+        search_engine.index_post(instance, category_id=_post_category_id(instance))
+
+
+# ============================================================================
+# THREAD / CATEGORY VERSION (template fragment cache + forum.page_cache)
+# ============================================================================
+# Tăng version sau commit, để request khác không cache lại nội dung chưa commit
+# dưới version mới.
+
+def _bump_thread(thread_id):
+    transaction.on_commit(lambda: bump_thread_version(thread_id))
+
+
+def _bump_category(category_id):
+    if category_id is not None:
+        transaction.on_commit(lambda: bump_category_version(category_id))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, raw=False, created=True, **kwargs):
+    if raw or _cascaded(kwargs):
+        return
+    _bump_thread(instance.thread_id)
+    # Sửa post không đổi danh sách thread của category
+    if created:
+        _bump_category(_post_category_id(instance))
+
+
+@receiver(post_save, sender=PostReaction)
+@receiver(post_delete, sender=PostReaction)
+def reaction_changed(sender, instance, raw=False, **kwargs):
+    if raw or _cascaded(kwargs):
+        return
+    if PostReaction.post.is_cached(instance):
+        thread_id = instance.post.thread_id
+    else:
+        thread_id = Post.objects.filter(pk=instance.post_id).values_list('thread_id', flat=True).first()
+    if thread_id is not None:
+        _bump_thread(thread_id)
+
+
+@receiver(post_save, sender=Thread)
+@receiver(post_delete, sender=Thread)
+def thread_changed(sender, instance, raw=False, **kwargs):
+    if not raw and not _deleted_with_author(kwargs):
+        _bump_thread(instance.pk)
+        _bump_category(instance.category_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_page_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _bump_category(instance.pk)
+
+
+# ============================================================================
+# CATEGORY TREE SNAPSHOT
+# ============================================================================
+
+# Chờ commit rồi mới đổi version, để request khác không dựng lại snapshot từ dữ liệu chưa commit.
+# post_delete không có `created` -> mặc định True (xóa luôn làm đổi cây).
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(category_tree.invalidate)
+
+
+@receiver(post_save, sender=Thread)
+@receiver(post_delete, sender=Thread)
+def thread_tree_changed(sender, instance, raw=False, created=True, update_fields=None, **kwargs):
+    # Tạo/xóa thread đổi counter; sửa title/category đổi last-post summary
+    if raw or _deleted_with_author(kwargs):
+        return
+    if created or _touches(update_fields, {'title', 'category'}):
+        transaction.on_commit(category_tree.invalidate)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_tree_changed(sender, instance, raw=False, created=True, **kwargs):
+    if not raw and created and not _cascaded(kwargs):
+        transaction.on_commit(category_tree.invalidate)
+
+
+# ============================================================================
+# UNREAD NOTIFICATION COUNTER
+# ============================================================================
+
+@receiver(post_save, sender=Notification)
+def notification_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and not instance.is_read:
+        unread.incr(instance.user_id)
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    if not instance.is_read and not _cascaded(kwargs):
+        unread.decr(instance.user_id)
+
+
+# ============================================================================
+# XÓA DÂY CHUYỀN (THREAD / USER)
+# ============================================================================
+# Xóa 1 thread hoặc 1 tài khoản kéo theo hàng nghìn Post / PostReaction /
+# Notification; trừ từng dòng thì mỗi post tốn vài query. Ở đây trừ 1 lần
+# theo nhóm (GROUP BY tác giả / thread / category) trước khi xóa, còn các
+# receiver từng dòng ở trên bỏ qua dòng bị xóa dây chuyền (_cascaded).
+
+def _post_stats(posts):
+    """[(author_id, số post, tổng like nhận được), ...] của QuerySet Post."""
+    return [
+        (author_id, n, likes or 0)
+        for author_id, n, likes in posts.values_list('author_id').annotate(n=Count('id'), likes=Sum('like_count')).order_by()
+    ]
+
+
+def _remove_post_stats(posts):
+    """Trừ post_count / reputation của tác giả các post sắp bị xóa. Trả về tổng số post."""
+    total = 0
+    for author_id, n, likes in _post_stats(posts):
+        total += n
+        UserProfile.adjust(
+            author_id,
+            post_count=-n,
+            reputation=-(n * UserProfile.REPUTATION_PER_POST + likes * UserProfile.REPUTATION_PER_LIKE),
+        )
+    return total
+
+
+def _deleting_user_ids(instance, kwargs):
+    """Id các user bị xóa cùng lúc (QuerySet.delete() trên User, vd admin xóa hàng loạt)."""
+    origin = kwargs.get('origin')
+    if isinstance(origin, QuerySet) and issubclass(origin.model, User):
+        return origin.values('pk')
+    return [instance.pk]
+
+
+def _remove_unread(notifications):
+    for user_id, n in notifications.filter(is_read=False).values_list('user_id').annotate(n=Count('id')).order_by():
+        unread.decr(user_id, n)
+
+
+@receiver(pre_delete, sender=Thread)
+def thread_deleting(sender, instance, **kwargs):
+    if _deleted_with_author(kwargs):
+        return
+    posts = _remove_post_stats(Post.objects.filter(thread_id=instance.pk))
+    if posts:
+        Category.objects.filter(pk=instance.category_id).update(post_count=_minus('post_count', posts))
+    _remove_unread(Notification.objects.filter(Q(thread_id=instance.pk) | Q(post__thread_id=instance.pk)))
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    user_id = instance.pk
+    deleting = _deleting_user_ids(instance, kwargs)
+    # Bị xóa theo: thread của user (cùng mọi post trong đó), post của user ở thread
+    # khác, reaction của user, profile. Chỉ cần trừ phần thuộc về người khác; phần
+    # nằm trong thread của user khác cũng đang bị xóa thì để receiver của user đó trừ.
+    _remove_post_stats(Post.objects.filter(thread__author_id=user_id).exclude(author_id__in=deleting))
+
+    threads_by_category = (
+        Thread.objects.filter(author_id=user_id)
+        .values_list('category_id')
+        .annotate(threads=Count('id', distinct=True), posts=Count('posts'))
+        .order_by()
+    )
+    category_deltas = defaultdict(lambda: [0, 0])
+    for category_id, threads, posts in threads_by_category:
+        category_deltas[category_id] = [threads, posts]
+
+    # Reply của user trong thread người khác: gom thread theo số reply bị xóa
+    threads_by_replies = defaultdict(list)
+    replied = (
+        Post.objects.filter(author_id=user_id).exclude(thread__author_id__in=deleting)
+        .values_list('thread_id', 'thread__category_id')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for thread_id, category_id, n in replied:
+        threads_by_replies[n].append(thread_id)
+        category_deltas[category_id][1] += n
+    for n, thread_ids in threads_by_replies.items():
+        for chunk in _chunks(thread_ids):
+            Thread.objects.filter(pk__in=chunk).update(reply_count=_minus('reply_count', n))
+
+    for category_id, (threads, posts) in category_deltas.items():
+        Category.objects.filter(pk=category_id).update(
+            thread_count=_minus('thread_count', threads),
+            post_count=_minus('post_count', posts),
+        )
+
+    # Reaction của user trên post không bị xóa
+    reactions = (
+        PostReaction.objects.filter(user_id=user_id)
+        .exclude(post__author_id__in=deleting)
+        .exclude(post__thread__author_id__in=deleting)
+    )
+    likes_by_author = (
+        reactions.filter(reaction_type='like')
+        .values_list('post__author_id').annotate(n=Count('id')).order_by()
+    )
+    for author_id, n in likes_by_author:
+        UserProfile.adjust(author_id, reputation=-n * UserProfile.REPUTATION_PER_LIKE)
+    posts_by_type = defaultdict(list)
+    reacted_threads = set()
+    for post_id, reaction_type, thread_id in reactions.values_list('post_id', 'reaction_type', 'post__thread_id'):
+        posts_by_type[reaction_type].append(post_id)
+        reacted_threads.add(thread_id)
+    for reaction_type, post_ids in posts_by_type.items():
+        for chunk in _chunks(post_ids):
+            Post.adjust_reaction_counts_many(chunk, {reaction_type: -1})
+
+    _remove_unread(
+        Notification.objects
+        .filter(
+            Q(sender_id=user_id) | Q(thread__author_id=user_id)
+            | Q(post__author_id=user_id) | Q(post__thread__author_id=user_id)
+        )
+        .exclude(user_id__in=deleting)
+    )
+
+    # last_post / last_poster chỉ chọn lại được sau khi post đã bị xóa (user_deleted)
+    instance._forum_cascade = (
+        [thread_id for thread_ids in threads_by_replies.values() for thread_id in thread_ids],
+        reacted_threads,
+        list(category_deltas),
+    )
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    replied_threads, reacted_threads, category_ids = getattr(instance, '_forum_cascade', ((), (), ()))
+    for chunk in _chunks(replied_threads):
+        # last_poster đã bị SET_NULL ở các thread mà user là người post mới nhất
+        Thread.objects.filter(pk__in=chunk, last_poster__isnull=True).update(
+            last_post_at=Coalesce(Thread.latest_post_subquery('created_at'), F('created_at')),
+            last_poster=Thread.latest_post_subquery('author'),
+        )
+    for chunk in _chunks(category_ids):
+        Category.objects.filter(pk__in=chunk, last_post__isnull=True).update(
+            last_post=Category.latest_post_subquery()
+        )
+
+    for thread_id in set(replied_threads) | set(reacted_threads):
+        _bump_thread(thread_id)
+    for category_id in category_ids:
+        _bump_category(category_id)
+    if category_ids:
+        transaction.on_commit(category_tree.invalidate)
+
+
+# ============================================================================
+# PUSH EVENTS (SSE)
+# ============================================================================
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    author = instance.author.username if Post.author.is_cached(instance) else None
+    data = {'type': 'reply', 'thread_id': instance.thread_id, 'post_id': instance.pk, 'author': author}
+    transaction.on_commit(lambda: events.publish(events.thread_channel(instance.thread_id), data))
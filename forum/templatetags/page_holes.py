@@ -0,0 +1,11 @@
+from django import template
+
+from forum import page_cache
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def page_hole(context, name):
+    """Phần riêng của người xem trong trang được cache (xem forum.page_cache)."""
+    return page_cache.render_hole(context.get('request'), name)
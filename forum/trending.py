@@ -0,0 +1,93 @@
+"""
+Tính điểm trending cho thread (chạy theo lô bằng `manage.py compute_trending`).
+
+score = Σ theo ngày (VIEW_WEIGHT * views + POST_WEIGHT * posts) * 0.5 ** (tuổi_ngày / HALF_LIFE_DAYS)
+
+Hoạt động trong cửa sổ FORUM_TRENDING_WINDOW_DAYS được nạp bằng vài truy vấn
+GROUP BY (thread, ngày) rồi chấm điểm toàn bộ trong một lượt; kết quả lưu vào
+cột có index Thread.trending_score để /forum/trending/ chỉ cần 1 lần đọc.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Thread, Post, ThreadView, ThreadViewDaily, RollupWatermark
+
+
+def _setting(name, default):
+    return getattr(settings, f"FORUM_TRENDING_{name}", default)
+
+
+def load_activity(since):
+    """Trả về (thread_ids, days, views, posts): các mảng song song theo (thread, ngày)."""
+    activity = defaultdict(lambda: [0, 0])
+    since_dt = datetime.combine(since, time.min)
+
+    for thread_id, day, views in (
+        ThreadViewDaily.objects.filter(date__gte=since)
+        .values_list('thread_id', 'date', 'views')
+    ):
+        activity[(thread_id, day)][0] += views
+
+    # Lượt xem chưa được rollup (sau watermark) vẫn nằm ở ThreadView thô
+    watermark = RollupWatermark.objects.filter(name=RollupWatermark.THREAD_VIEWS).values_list('last_id', flat=True).first() or 0
+    for thread_id, day, views in (
+        ThreadView.objects.filter(pk__gt=watermark, viewed_at__gte=since_dt)
+        .annotate(day=TruncDate('viewed_at'))
+        .values('thread_id', 'day').annotate(n=Count('id')).order_by()
+        .values_list('thread_id', 'day', 'n')
+    ):
+        activity[(thread_id, day)][0] += views
+
+    for thread_id, day, posts in (
+        Post.objects.filter(created_at__gte=since_dt)
+        .annotate(day=TruncDate('created_at'))
+        .values('thread_id', 'day').annotate(n=Count('id')).order_by()
+        .values_list('thread_id', 'day', 'n')
+    ):
+        activity[(thread_id, day)][1] += posts
+
+    keys = list(activity)
+    return (
+        [k[0] for k in keys],
+        [k[1] for k in keys],
+        [activity[k][0] for k in keys],
+        [activity[k][1] for k in keys],
+    )
+
+
+def score(days, views, posts, today):
+    """Chấm điểm các dòng hoạt động (mảng song song) -> mảng điểm đã decay."""
+    view_weight = _setting('VIEW_WEIGHT', 1.0)
+    post_weight = _setting('POST_WEIGHT', 2.0)
+    half_life = _setting('HALF_LIFE_DAYS', 2.0)
+    return [
+        (view_weight * v + post_weight * p) * 0.5 ** ((today - d).days / half_life)
+        for d, v, p in zip(days, views, posts)
+    ]
+
+
+def compute_trending(now=None):
+    """Tính lại Thread.trending_score cho mọi thread. Trả về số thread có điểm > 0."""
+    today = (now or timezone.now()).date()
+    since = today - timedelta(days=_setting('WINDOW_DAYS', 7))
+
+    thread_ids, days, views, posts = load_activity(since)
+    totals = defaultdict(float)
+    for thread_id, value in zip(thread_ids, score(days, views, posts, today)):
+        totals[thread_id] += value
+
+    threads = list(Thread.objects.filter(pk__in=totals.keys()).only('pk', 'trending_score'))
+    for thread in threads:
+        thread.trending_score = round(totals[thread.pk], 4)
+
+    with transaction.atomic():
+        # Thread không còn hoạt động trong cửa sổ -> về 0
+        Thread.objects.filter(trending_score__gt=0).update(trending_score=0)
+        Thread.objects.bulk_update(threads, ['trending_score'], batch_size=500)
+    return len(threads)
@@ -0,0 +1,66 @@
+"""
+Bộ đếm notification chưa đọc của từng user, giữ trong cache.
+
+- Tạo notification (signal / bulk_create trong forum.notify) -> incr
+- Đánh dấu đã đọc / xóa -> decr hoặc reset về 0
+- Key hết hạn sau FORUM_UNREAD_RECONCILE_SECONDS: lần đọc kế tiếp đếm lại từ DB
+  (index (user, is_read)), nên sai lệch (incr bị mất khi key chưa có, ...) chỉ
+  tồn tại tối đa chừng đó thời gian.
+- Mỗi thay đổi được đẩy lên kênh user:<id> (forum.events) cho các tab đang mở.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from . import events
+
+
+def _key(user_id):
+    return f"forum:unread:{user_id}"
+
+
+def _ttl():
+    return getattr(settings, "FORUM_UNREAD_RECONCILE_SECONDS", 600)
+
+
+def reconcile(user_id):
+    """Đếm lại từ DB và ghi vào cache."""
+    from .models import Notification
+
+    count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+    cache.set(_key(user_id), count, _ttl())
+    return count
+
+
+def get_count(user_id):
+    count = cache.get(_key(user_id))
+    if count is None or count < 0:
+        return reconcile(user_id)
+    return count
+
+
+def _publish(user_id, count):
+    # count=None: client tự gọi lại notification_count
+    events.publish(events.user_channel(user_id), {'type': 'unread', 'count': count})
+
+
+def incr(user_id, delta=1):
+    try:
+        count = cache.incr(_key(user_id), delta)
+    except ValueError:
+        # Chưa có trong cache: lần đọc sau sẽ đếm lại từ DB
+        count = None
+    _publish(user_id, count if count is None or count >= 0 else None)
+
+
+def incr_many(user_ids):
+    for user_id in user_ids:
+        incr(user_id)
+
+
+def decr(user_id, delta=1):
+    incr(user_id, -delta)
+
+
+def reset(user_id):
+    cache.set(_key(user_id), 0, _ttl())
+    _publish(user_id, 0)
@@ -36,6 +36,9 @@ urlpatterns = [
     path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
     path('notifications/count/', views.notification_count, name='notification_count'),
 
+    # Server-sent events (số thông báo chưa đọc, reply mới trong thread)
+    path('events/', views.event_stream, name='event_stream'),
+
     # Bookmarks
     path('bookmarks/', views.bookmarks_list, name='bookmarks'),
     path('thread/<int:thread_id>/bookmark/', views.toggle_bookmark, name='toggle_bookmark'),
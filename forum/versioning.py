@@ -0,0 +1,57 @@
+"""
+Số version theo thread / category, dùng làm khóa cho template fragment cache
+và page cache (forum.page_cache).
+
+Version thread tăng khi thread được sửa / có reply / post bị sửa, xóa /
+reaction thay đổi; version category tăng khi thread trong đó được tạo, sửa,
+xóa hoặc có post mới / bị xóa (xem forum.signals). Nội dung cũ tự bị bỏ qua
+mà không cần xóa cache.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def _get(key, create=True):
+    version = cache.get(key)
+    if version is None and create:
+        # Key bị evict: khởi tạo theo thời gian để không trùng version cũ còn trong cache
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def _bump(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Chưa có key -> tạo mới (giá trị theo thời gian luôn lớn hơn version cũ)
+        version = int(time.time() * 1000)
+        cache.set(key, version, None)
+        return version
+
+
+def _thread_key(thread_id):
+    return f"forum:thread_version:{thread_id}"
+
+
+def _category_key(category_id):
+    return f"forum:category_version:{category_id}"
+
+
+def thread_version(thread_id, create=True):
+    """create=False: trả None nếu chưa có version (không tạo key cho id bất kỳ)."""
+    return _get(_thread_key(thread_id), create)
+
+
+def bump_thread_version(thread_id):
+    return _bump(_thread_key(thread_id))
+
+
+def category_version(category_id):
+    return _get(_category_key(category_id))
+
+
+def bump_category_version(category_id):
+    return _bump(_category_key(category_id))
@@ -0,0 +1,122 @@
+"""
+Ghi lượt xem thread theo kiểu write-behind.
+
+thread_detail chỉ gọi record() -> cộng dồn trong bộ nhớ process, không ghi DB.
+Một thread nền flush định kỳ (FORUM_VIEW_FLUSH_INTERVAL giây):
+  - Thread.views được cộng bằng UPDATE ... SET views = views + n (atomic)
+  - ThreadView được ghi bằng bulk_create theo lô
+Khi process tắt (atexit) buffer còn lại cũng được flush. Flush lỗi (DB down) thì
+buffer được trả lại để lần sau ghi tiếp.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending_views = Counter()   # thread_id -> số lượt xem chưa ghi
+_pending_events = []         # ThreadView chưa ghi
+_worker = None
+_wake = threading.Event()
+
+
+def _flush_interval():
+    return getattr(settings, "FORUM_VIEW_FLUSH_INTERVAL", 10)
+
+
+def _max_pending():
+    return getattr(settings, "FORUM_VIEW_MAX_PENDING", 5000)
+
+
+def _max_retained():
+    return getattr(settings, "FORUM_VIEW_MAX_RETAINED", 50000)
+
+
+def record(thread_id, user_id=None, ip_address=None):
+    """Ghi nhận 1 lượt xem vào buffer (không chạm DB)."""
+    from .models import ThreadView
+
+    event = ThreadView(thread_id=thread_id, user_id=user_id, ip_address=ip_address, viewed_at=timezone.now())
+    with _lock:
+        _pending_views[thread_id] += 1
+        _pending_events.append(event)
+        overflow = len(_pending_events) >= _max_pending()
+    _ensure_worker()
+    if overflow:
+        # Buffer quá lớn (worker bị chậm) -> đánh thức worker flush ngay
+        _wake.set()
+
+
+def pending(thread_id):
+    """Số lượt xem của thread đang nằm trong buffer (để hiển thị cho đúng)."""
+    with _lock:
+        return _pending_views.get(thread_id, 0)
+
+
+def flush():
+    """Ghi toàn bộ buffer xuống DB. Trả về số lượt xem đã ghi."""
+    from .models import Thread, ThreadView
+
+    with _lock:
+        if not _pending_events:
+            return 0
+        views = dict(_pending_views)
+        events = list(_pending_events)
+        _pending_views.clear()
+        _pending_events.clear()
+
+    try:
+        with transaction.atomic():
+            for thread_id, count in views.items():
+                Thread.objects.filter(pk=thread_id).update(views=F('views') + count)
+            # Thread có thể đã bị xóa trong lúc chờ flush
+            existing = set(Thread.objects.filter(pk__in=views.keys()).values_list('pk', flat=True))
+            ThreadView.objects.bulk_create(
+                [e for e in events if e.thread_id in existing],
+                batch_size=500,
+            )
+    except Exception:
+        logger.exception("Không flush được %d lượt xem thread, sẽ thử lại", len(events))
+        with _lock:
+            # Trả lại buffer để lần flush sau ghi tiếp. Bộ đếm chỉ là 1 số/thread nên
+            # giữ đủ; ThreadView thì không để phình vô hạn.
+            _pending_views.update(views)
+            _pending_events[:0] = events
+            overflow = len(_pending_events) - _max_retained()
+            if overflow > 0:
+                del _pending_events[:overflow]
+                logger.error("Bỏ %d ThreadView cũ nhất do buffer đầy", overflow)
+        return 0
+    return len(events)
+
+
+# ============================================================================
+# WORKER NỀN
+# ============================================================================
+
+def _run():
+    while True:
+        _wake.wait(_flush_interval())
+        _wake.clear()
+        close_old_connections()
+        flush()
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None:
+        return
+    with _lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name="forum-view-buffer", daemon=True)
+            _worker.start()
+
+
+atexit.register(flush)
@@ -1,35 +1,65 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.contrib import messages
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.views.decorators.cache import cache_page
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag
 
-from .models import Category, Thread, Post, Notification, Bookmark, Report, ThreadFollow, PostReaction, UserProfile, ThreadView
+from .models import Category, Thread, Post, Notification, Bookmark, Report, ThreadFollow, PostReaction, UserProfile
 from .forms import ThreadCreateForm, PostForm, ReportForm
+from .pagination import KeysetPaginator
+from .versioning import thread_version, category_version
+from .page_cache import anonymous_page_cache
+from . import view_buffer, search_engine, category_tree, notify, unread, events, mentions
 
 User = get_user_model()
 
 
-@cache_page(60 * 5)  # Cache for 5 minutes
+def _client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0]
+    return request.META.get('REMOTE_ADDR')
+
+
+def _record_thread_view(request, pk):
+    # Track view: chỉ ghi vào buffer, view_buffer sẽ flush xuống DB theo lô
+    view_buffer.record(
+        pk,
+        user_id=request.user.pk if request.user.is_authenticated else None,
+        ip_address=_client_ip(request),
+    )
+
+
+def _category_page_version(request, slug):
+    node = category_tree.get_node_by_slug(slug)
+    return category_version(node['id']) if node else None
+
+
+def _thread_page_version(request, pk):
+    # Chưa có version (thread chưa ai xem / không tồn tại) -> render bình thường
+    return thread_version(pk, create=False)
+
+
+# Trang chủ không có phần riêng nào ngoài các hole -> dùng chung shell cho mọi người
+@anonymous_page_cache(lambda request: category_tree.version(), shell=True)
 def home(request):
     """
     Trang chủ diễn đàn: liệt kê categories theo kiểu Voz.
     """
     from django.core.cache import cache
     
-    # Try to get categories from cache
-    categories = cache.get('forum_categories')
-    if not categories:
-        categories = (
-            Category.objects
-            .filter(parent__isnull=True)
-            .prefetch_related('sub_forums')
-            .order_by('order', 'title')
-        )
-        cache.set('forum_categories', categories, 60 * 10)  # Cache for 10 minutes
+    # Cây category đọc từ snapshot trong bộ nhớ (forum.category_tree), không query
+    categories = category_tree.roots()
     
     featured_threads = (
         Thread.objects
@@ -65,6 +95,7 @@ def home(request):
     })
 
 
+@anonymous_page_cache(_category_page_version, shell=True)
 def category_view(request, slug):
     """
     Hiển thị tất cả threads trong một category với pagination
@@ -74,20 +105,17 @@ def category_view(request, slug):
     threads_list = (
         Thread.objects
         .filter(category=category)
-        .select_related('author', 'category')
-        .order_by('-pinned', '-updated_at')
+        .select_related('author', 'category', 'last_poster')
     )
     
-    # Pagination
-    paginator = Paginator(threads_list, 20)  # 20 threads per page
-    page = request.GET.get('page')
-    
-    try:
-        threads = paginator.page(page)
-    except PageNotAnInteger:
-        threads = paginator.page(1)
-    except EmptyPage:
-        threads = paginator.page(paginator.num_pages)
+    # Keyset pagination: seek theo (pinned, last_post_at, id) thay vì OFFSET
+    paginator = KeysetPaginator(
+        threads_list, 20,  # 20 threads per page
+        ordering=('-pinned', '-last_post_at', '-id'),
+        count=category.thread_count,
+        cache_key=f"forum:category_pages:{category.pk}:{category.thread_count}:{category.last_post_id}",
+    )
+    threads = paginator.page_from_request(request)
     
     return render(request, 'forum/category_threads.html', {
         'category': category,
@@ -121,12 +149,13 @@ def thread_create(request):
             )
 
             # tạo Post đầu tiên (nội dung mở đầu)
-            Post.objects.create(
+            first_post = Post.objects.create(
                 thread=thread,
                 author=request.user,
                 content=content,
                 created_at=timezone.now(),
             )
+            mentions.notify(first_post)
 
             return redirect("forum:thread_detail", pk=thread.id)
     else:
@@ -135,6 +164,8 @@ def thread_create(request):
     return render(request, "forum/thread_create.html", {"form": form})
 
 
+# Trang thread có nhiều phần riêng của user (form reply, bookmark, reaction) -> chỉ cache cho khách
+@anonymous_page_cache(_thread_page_version, on_hit=_record_thread_view)
 def thread_detail(request, pk):
     """
     Xem thread + tất cả post trong đó.
@@ -147,41 +178,26 @@ def thread_detail(request, pk):
         pk=pk
     )
     
-    # Track view
-    thread.increment_views()
-    
-    # Record detailed view tracking
-    def get_client_ip(request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-    
-    ThreadView.objects.create(
-        thread=thread,
-        user=request.user if request.user.is_authenticated else None,
-        ip_address=get_client_ip(request)
-    )
+    _record_thread_view(request, thread.pk)
+    thread.views += view_buffer.pending(thread.pk)
 
     posts_list = (
         Post.objects
         .filter(thread=thread)
         .select_related("author")
-        .order_by("created_at")
     )
     
-    # Pagination for posts
-    paginator = Paginator(posts_list, 15)  # 15 posts per page
-    page = request.GET.get('page')
-    
-    try:
-        posts = paginator.page(page)
-    except PageNotAnInteger:
-        posts = paginator.page(1)
-    except EmptyPage:
-        posts = paginator.page(paginator.num_pages)
+    # Keyset pagination for posts: seek theo (created_at, id).
+    # Cursor đầu trang cache theo version thread (tăng khi có reply / post bị xóa),
+    # reply_count thôi không đủ: xóa 1 post rồi thêm 1 post thì số vẫn như cũ.
+    version = thread_version(thread.pk)
+    paginator = KeysetPaginator(
+        posts_list, 15,  # 15 posts per page
+        ordering=('created_at', 'id'),
+        count=thread.reply_count + 1,
+        cache_key=f"forum:thread_pages:{thread.pk}:{version}",
+    )
+    posts = paginator.page_from_request(request)
 
     if request.method == "POST":
         if not request.user.is_authenticated:
@@ -209,17 +225,9 @@ def thread_detail(request, pk):
                     message=f"{reply.author.username} đã reply thread của bạn: {thread.title}"
                 )
 
-            # Tạo notification cho users follow thread này
-            followers = ThreadFollow.objects.filter(thread=thread).exclude(user=reply.author)
-            for follow in followers:
-                Notification.objects.create(
-                    user=follow.user,
-                    notification_type='thread_follow',
-                    sender=reply.author,
-                    thread=thread,
-                    post=reply,
-                    message=f"Thread bạn theo dõi có bài mới: {thread.title}"
-                )
+            # Notification cho users follow thread này: gửi ở nền theo lô (forum.notify)
+            notify.queue_reply(reply)
+            mentions.notify(reply)
 
             return redirect("forum:thread_detail", pk=thread.id)
     else:
@@ -234,6 +242,10 @@ def thread_detail(request, pk):
     
     ctx = {
         "thread": thread,
+        "thread_version": version,
+        # Số reaction nằm sẵn trên từng Post; chỉ cần 1 truy vấn cho reaction của người xem
+        "my_reactions": PostReaction.lookup(request.user, posts),
+        "category_path": category_tree.ancestors(thread.category_id),
         "posts": posts,
         "form": form,
         "is_bookmarked": is_bookmarked,
@@ -254,9 +266,8 @@ def new_posts(request):
 def latest_activity(request):
     threads = (
         Thread.objects
-        .select_related('author', 'category')
-        .prefetch_related('posts')
-        .order_by('-updated_at')[:50]
+        .select_related('author', 'category', 'last_poster')
+        .order_by('-last_post_at')[:50]
     )
     return render(request, 'forum/latest_activity.html', {'threads': threads})
 
@@ -275,39 +286,82 @@ def profile_view(request, username):
     user = get_object_or_404(User, username=username)
     profile_posts = user.profile_posts.select_related('author').order_by('-created_at')
     
-    post_count = Post.objects.filter(author=user).count()
-    thread_count = Thread.objects.filter(author=user).count()
+    # Số post/thread đọc từ UserProfile (forum.signals giữ cho luôn đúng)
+    profile, created = UserProfile.objects.get_or_create(user=user)
+    if created:
+        profile.update_counts()
     
     ctx = {
         'profile_user': user,
         'profile_posts': profile_posts,
-        'post_count': post_count,
-        'thread_count': thread_count,
+        'post_count': profile.post_count,
+        'thread_count': profile.thread_count,
     }
     return render(request, 'forum/profile.html', ctx)
 
 
 def search(request):
-    query = request.GET.get('q', '')
-    results = []
-    
+    """
+    Tìm kiếm bằng inverted index (forum.search_engine), xếp hạng BM25.
+    Lọc: ?category=<slug>&author=<username>&since=YYYY-MM-DD&until=YYYY-MM-DD
+    """
+    from datetime import datetime, timedelta
+    from urllib.parse import urlencode
+
+    query = request.GET.get('q', '').strip()
+    filters = {key: request.GET.get(key, '').strip() for key in ('category', 'author', 'since', 'until')}
+
+    def parse_date(value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            return None
+
+    ctx = {
+        'query': query,
+        'filters': filters,
+        'categories': Category.objects.only('title', 'slug'),
+    }
+
     if query:
-        from django.db.models import Q
-        threads = Thread.objects.filter(
-            Q(title__icontains=query) | Q(posts__content__icontains=query)
-        ).select_related('author', 'category').distinct()[:50]
-        
-        posts = Post.objects.filter(
-            Q(content__icontains=query)
-        ).select_related('author', 'thread', 'thread__category')[:50]
-        
-        results = {
-            'threads': threads,
-            'posts': posts,
-            'query': query
-        }
+        category = Category.objects.filter(slug=filters['category']).first() if filters['category'] else None
+        author = User.objects.filter(username=filters['author']).first() if filters['author'] else None
+        since = parse_date(filters['since'])
+        until = parse_date(filters['until'])
+
+        if (filters['category'] and not category) or (filters['author'] and not author):
+            hits = search_engine.SearchResults()
+        else:
+            hits = search_engine.search(
+                query,
+                category=category,
+                author=author,
+                since=since,
+                until=until + timedelta(days=1) if until else None,
+            )
+
+        thread_ids = search_engine.thread_hits(hits)[:10]
+        threads = Thread.objects.select_related('author', 'category').in_bulk(thread_ids)
+
+        paginator = Paginator(search_engine.post_hits(hits), 20)
+        try:
+            page = paginator.page(request.GET.get('page'))
+        except PageNotAnInteger:
+            page = paginator.page(1)
+        except EmptyPage:
+            page = paginator.page(paginator.num_pages)
+
+        ctx.update({
+            'threads': [threads[pk] for pk in thread_ids if pk in threads] if page.number == 1 else [],
+            'posts': search_engine.load_posts(page.object_list),
+            'page_obj': page,
+            'total_posts': paginator.count,
+            'search_truncated': hits.truncated,
+            'ignored_terms': hits.ignored_terms,
+            'extra_query': urlencode({'q': query, **{k: v for k, v in filters.items() if v}}),
+        })
     
-    return render(request, 'forum/search.html', results)
+    return render(request, 'forum/search.html', ctx)
 
 
 # ============================================================================
@@ -321,6 +375,7 @@ def notifications_list(request):
     
     # Mark all as read when viewing
     request.user.notifications.filter(is_read=False).update(is_read=True)
+    unread.reset(request.user.pk)
     
     return render(request, 'forum/notifications.html', {
         'notifications': notifications
@@ -331,16 +386,82 @@ def notifications_list(request):
 def mark_notification_read(request, notification_id):
     """Đánh dấu 1 thông báo đã đọc"""
     notification = get_object_or_404(Notification, id=notification_id, user=request.user)
-    notification.is_read = True
-    notification.save()
+    if not notification.is_read:
+        notification.is_read = True
+        notification.save(update_fields=['is_read'])
+        unread.decr(request.user.pk)
     return redirect('forum:notifications')
 
 
+def _notification_count_etag(request):
+    return f"unread-{request.user.pk}-{unread.get_count(request.user.pk)}"
+
+
 @login_required
+@cache_control(private=True, max_age=20)
+@etag(_notification_count_etag)
 def notification_count(request):
-    """API trả về số thông báo chưa đọc (JSON)"""
-    count = request.user.notifications.filter(is_read=False).count()
-    return JsonResponse({'count': count})
+    """API trả về số thông báo chưa đọc (JSON), đọc từ bộ đếm trong cache.
+
+    ETag theo số đếm: tab không có gì mới nhận 304, trình duyệt dùng lại
+    response trong 20 giây giữa các tab.
+    """
+    return JsonResponse({'count': unread.get_count(request.user.pk)})
+
+
+# ============================================================================
+# PUSH EVENTS (SSE)
+# ============================================================================
+
+SSE_HEARTBEAT_SECONDS = 20
+SSE_MAX_SECONDS = 300  # đóng định kỳ, EventSource tự kết nối lại
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def event_stream(request):
+    """
+    Kênh server-sent events: số thông báo chưa đọc (user đang login) và
+    "có reply mới" cho thread ?thread=<id>. View async: dưới ASGI mỗi kết nối
+    chỉ là 1 coroutine chờ trên hàng đợi của forum.events, không giữ worker.
+    Dưới WSGI trả 204 để client dùng polling.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    channels = []
+    if user.is_authenticated:
+        channels.append(events.user_channel(user.pk))
+    thread_id = request.GET.get('thread', '')
+    if thread_id.isdigit():
+        channels.append(events.thread_channel(int(thread_id)))
+    if not channels:
+        return HttpResponse(status=204)
+
+    async def stream():
+        # Đăng ký trước rồi mới đọc số đếm ban đầu để không lọt sự kiện ở giữa
+        async with events.subscribe(channels) as sub:
+            yield "retry: 5000\n\n"
+            if user.is_authenticated:
+                count = await sync_to_async(unread.get_count)(user.pk)
+                yield _sse('unread', {'type': 'unread', 'count': count})
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + SSE_MAX_SECONDS
+            while loop.time() < deadline:
+                try:
+                    _, data = await sub.get(SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield _sse(data['type'], data)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: không buffer
+    return response
 
 
 # ============================================================================
@@ -440,41 +561,24 @@ def toggle_reaction(request, post_id):
     
     post = get_object_or_404(Post, pk=post_id)
     reaction_type = request.POST.get('reaction_type', 'like')
+    if reaction_type not in dict(PostReaction.REACTION_TYPES):
+        return JsonResponse({'error': 'Invalid reaction type'}, status=400)
     
-    # Check if user already reacted
-    existing_reaction = PostReaction.objects.filter(user=request.user, post=post).first()
+    # Thêm / bỏ / đổi reaction + cập nhật cột đếm trên Post trong 1 transaction
+    action, reaction_counts = PostReaction.toggle(post, request.user, reaction_type)
     
-    if existing_reaction:
-        if existing_reaction.reaction_type == reaction_type:
-            # Remove reaction if same type
-            existing_reaction.delete()
-            action = 'removed'
-        else:
-            # Change reaction type
-            existing_reaction.reaction_type = reaction_type
-            existing_reaction.save()
-            action = 'changed'
-    else:
-        # Create new reaction
-        PostReaction.objects.create(user=request.user, post=post, reaction_type=reaction_type)
-        action = 'added'
-        
+    if action == 'added':
         # Create notification for post author
-        if post.author != request.user:
+        if post.author_id != request.user.pk:
             Notification.objects.create(
-                user=post.author,
-                notification_type='mention',
+                user_id=post.author_id,
+                notification_type='reaction',
                 sender=request.user,
-                thread=post.thread,
+                thread_id=post.thread_id,
                 post=post,
                 message=f"{request.user.username} đã react {reaction_type} bài viết của bạn"
             )
     
-    # Get updated reaction counts
-    from django.db.models import Count
-    reactions = PostReaction.objects.filter(post=post).values('reaction_type').annotate(count=Count('reaction_type'))
-    reaction_counts = {r['reaction_type']: r['count'] for r in reactions}
-    
     return JsonResponse({
         'action': action,
         'reaction_counts': reaction_counts,
@@ -512,21 +616,13 @@ def user_profile(request, username):
 
 
 def trending_threads(request):
-    """Show trending threads based on views and recent activity"""
-    from django.db.models import Count, F, Q
-    from datetime import timedelta
-    
-    # Calculate trending score: recent views + recent posts
-    recent_date = timezone.now() - timedelta(days=7)
-    
-    threads = Thread.objects.annotate(
-        recent_views=Count('thread_views', filter=Q(thread_views__viewed_at__gte=recent_date)),
-        recent_posts=Count('posts', filter=Q(posts__created_at__gte=recent_date)),
-    ).annotate(
-        trending_score=F('recent_views') + F('recent_posts') * 2
-    ).filter(
-        trending_score__gt=0
-    ).select_related('author', 'category').order_by('-trending_score')[:50]
+    """Show trending threads (điểm được tính sẵn bởi `manage.py compute_trending`)"""
+    threads = (
+        Thread.objects
+        .filter(trending_score__gt=0)
+        .select_related('author', 'category')
+        .order_by('-trending_score')[:50]
+    )
     
     return render(request, 'forum/trending.html', {'threads': threads})
 
@@ -1,6 +1,16 @@
 // Reaction System for VOZ Forum
 
 document.addEventListener('DOMContentLoaded', function() {
+    // Highlight reaction của người xem ({post_id: reaction_type} do view render sẵn)
+    const myReactionsEl = document.getElementById('my-reactions');
+    if (myReactionsEl) {
+        const myReactions = JSON.parse(myReactionsEl.textContent);
+        for (const [postId, reactionType] of Object.entries(myReactions)) {
+            const btn = document.querySelector(`.reaction-btn[data-post-id="${postId}"][data-reaction-type="${reactionType}"]`);
+            if (btn) btn.classList.add('active');
+        }
+    }
+
     // Handle reaction button clicks
     document.querySelectorAll('.reaction-btn').forEach(button => {
         button.addEventListener('click', async function(e) {
@@ -80,28 +90,75 @@ function updateReactionCounts(postId, reactionCounts) {
     }
 }
 
+function renderNotificationCount(count) {
+    const badge = document.querySelector('.notification-badge');
+    if (badge) {
+        if (count > 0) {
+            badge.textContent = count > 99 ? '99+' : count;
+            badge.style.display = 'inline-block';
+        } else {
+            badge.style.display = 'none';
+        }
+    }
+}
+
 // Auto-update notification count
 async function updateNotificationCount() {
     try {
         const response = await fetch('/forum/notifications/count/');
         const data = await response.json();
-        
-        const badge = document.querySelector('.notification-badge');
-        if (badge) {
-            if (data.count > 0) {
-                badge.textContent = data.count > 99 ? '99+' : data.count;
-                badge.style.display = 'inline-block';
-            } else {
-                badge.style.display = 'none';
-            }
-        }
+        renderNotificationCount(data.count);
     } catch (error) {
         console.error('Error fetching notification count:', error);
     }
 }
 
-// Update notification count every 30 seconds
-if (document.querySelector('.notification-badge')) {
-    setInterval(updateNotificationCount, 30000);
+// Polling dự phòng: update notification count every 30 seconds
+let notificationPoller = null;
+function startNotificationPolling() {
+    if (notificationPoller || !document.querySelector('.notification-badge')) return;
+    notificationPoller = setInterval(updateNotificationCount, 30000);
     updateNotificationCount(); // Initial load
 }
+
+// Server-sent events: số thông báo + reply mới trong thread đang xem
+function connectEvents() {
+    const threadEl = document.querySelector('[data-thread-id]');
+    const hasBadge = !!document.querySelector('.notification-badge');
+    if (!hasBadge && !threadEl) return;
+
+    if (!window.EventSource) {
+        startNotificationPolling();
+        return;
+    }
+
+    const url = threadEl ? `/forum/events/?thread=${threadEl.dataset.threadId}` : '/forum/events/';
+    const source = new EventSource(url);
+
+    source.addEventListener('unread', function(e) {
+        const data = JSON.parse(e.data);
+        if (data.count === null) {
+            updateNotificationCount();
+        } else {
+            renderNotificationCount(data.count);
+        }
+    });
+
+    source.addEventListener('reply', function(e) {
+        const data = JSON.parse(e.data);
+        if (window.UXImprovements && window.UXImprovements.showToast) {
+            const who = data.author ? `${data.author} vừa` : 'Có người vừa';
+            window.UXImprovements.showToast(`${who} trả lời thread này`, 'info');
+        }
+    });
+
+    source.onerror = function() {
+        // CLOSED: server không hỗ trợ SSE (vd 204 khi chạy WSGI) -> chuyển sang polling.
+        // CONNECTING: EventSource tự kết nối lại.
+        if (source.readyState === EventSource.CLOSED) {
+            startNotificationPolling();
+        }
+    };
+}
+
+connectEvents();
@@ -0,0 +1,412 @@
+"""
+Cache 2 tầng: L1 trong bộ nhớ process (LRU có giới hạn, hết hạn theo TTL)
+đứng trước L2 dùng chung giữa các process (một alias khác trong CACHES,
+vd FileBasedCache trên đĩa local hoặc Redis/Memcached qua socket).
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'twofa_site.cache.TieredCache',
+            'OPTIONS': {
+                'SHARED': 'shared',      # alias của tầng L2
+                'TIERS': 'l1+l2',        # 'l1+l2' | 'l1' | 'l2'
+                'L1_MAX_ENTRIES': 1000,
+                'L1_TIMEOUT': 5,         # giây tối đa 1 entry nằm ở L1
+                'L2_ONLY': ['forum:unread:', ...],  # prefix key không bao giờ vào L1
+            },
+        },
+        'shared': {...},
+    }
+
+L1 chỉ giữ entry tối đa L1_TIMEOUT giây nên dữ liệu process khác ghi vào L2
+chỉ bị trễ tối đa chừng đó ở process này. Entry đọc từ L2 được chép lên L1
+không quá hạn còn lại ở L2 nếu backend L2 cho biết hạn (get_with_expiry(),
+có ở LockingFileBasedCache); backend khác thì trễ tối đa L1_TIMEOUT. Bộ đếm và version (key được incr)
+không chịu được độ trễ đó -> khai báo prefix trong L2_ONLY để luôn đọc/ghi
+thẳng L2; incr/decr luôn đi qua L2 và bỏ bản sao ở L1.
+Số hit/miss từng tầng xem qua cache.metrics().
+
+L2 phải có incr atomic giữa các process: Redis / Memcached, hoặc
+LockingFileBasedCache bên dưới thay cho FileBasedCache của Django (incr của
+FileBasedCache là get rồi set, mất lượt tăng khi ghi đồng thời và đặt lại TTL).
+"""
+import os
+import pickle
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+from django.core.files.move import file_move_safe
+
+TIERS = ('l1+l2', 'l1', 'l2')
+
+_MISSING = object()
+
+_l1_stores = {}
+
+
+class TieredCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.tiers = options.get('TIERS', 'l1+l2')
+        if self.tiers not in TIERS:
+            raise ValueError(f"TieredCache: TIERS phải là một trong {TIERS}, không phải {self.tiers!r}")
+        self.shared_alias = options.get('SHARED', location or None)
+        if self.tiers != 'l1' and not self.shared_alias:
+            raise ValueError("TieredCache: cần OPTIONS['SHARED'] (alias của tầng L2)")
+        self.l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.l2_only = tuple(options.get('L2_ONLY', ()))
+
+        self.use_l1 = self.tiers in ('l1+l2', 'l1')
+        self.use_l2 = self.tiers in ('l1+l2', 'l2')
+
+        # Django tạo 1 instance backend cho mỗi thread -> L1 và metrics phải dùng
+        # chung theo process (giống LocMemCache), khóa theo LOCATION nếu có.
+        name = location or f"{self.shared_alias}:{self.tiers}"
+        self._l1, self._lock, self._metrics = _l1_stores.setdefault(name, (
+            OrderedDict(),  # key -> (expire_at | None, pickled value)
+            threading.Lock(),
+            {'l1': {'hits': 0, 'misses': 0}, 'l2': {'hits': 0, 'misses': 0}},
+        ))
+
+    @property
+    def l2(self):
+        # caches[...] là thread-local, lấy mỗi lần dùng
+        return caches[self.shared_alias]
+
+    # --- metrics --------------------------------------------------------------
+
+    def _count(self, tier, hit):
+        self._metrics[tier]['hits' if hit else 'misses'] += 1
+
+    def metrics(self):
+        result = {}
+        for tier, counters in self._metrics.items():
+            total = counters['hits'] + counters['misses']
+            result[tier] = dict(counters, hit_rate=counters['hits'] / total if total else 0.0)
+        result['l1']['entries'] = len(self._l1)
+        return result
+
+    def reset_metrics(self):
+        for counters in self._metrics.values():
+            counters['hits'] = counters['misses'] = 0
+
+    # --- L1 -------------------------------------------------------------------
+
+    def _in_l1(self, key):
+        """Key (chưa make_key) có được giữ ở L1 không."""
+        if not self.use_l1:
+            return False
+        return not (self.use_l2 and self.l2_only and key.startswith(self.l2_only))
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _l1_expiry(self, timeout):
+        """Hạn của entry ở L1: min(timeout, L1_TIMEOUT) khi có L2 phía sau."""
+        if timeout is None:
+            ttl = self.l1_timeout if self.use_l2 else None
+        elif self.use_l2 and self.l1_timeout is not None:
+            ttl = min(timeout, self.l1_timeout)
+        else:
+            ttl = timeout
+        return None if ttl is None else time.monotonic() + ttl
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return _MISSING
+            expire_at, data = entry
+            if expire_at is not None and expire_at <= time.monotonic():
+                del self._l1[key]
+                return _MISSING
+            self._l1.move_to_end(key)
+        return pickle.loads(data)
+
+    def _l1_set(self, key, value, timeout):
+        if timeout is not None and timeout <= 0:
+            self._l1_delete(key)
+            return
+        data = pickle.dumps(value, self.pickle_protocol)
+        expire_at = self._l1_expiry(timeout)
+        with self._lock:
+            self._l1[key] = (expire_at, data)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._lock:
+            return self._l1.pop(key, None) is not None
+
+    def _l2_get(self, key, version, in_l1):
+        """(value | _MISSING, timeout để chép lên L1) - không giữ ở L1 lâu hơn hạn còn lại ở L2."""
+        l2 = self.l2
+        if not (in_l1 and hasattr(l2, 'get_with_expiry')):
+            return l2.get(key, _MISSING, version=version), self.l1_timeout
+        value, expiry = l2.get_with_expiry(key, _MISSING, version=version)
+        if expiry is None:
+            return value, self.l1_timeout
+        remaining = expiry - time.time()
+        return value, remaining if self.l1_timeout is None else min(self.l1_timeout, remaining)
+
+    # --- API cache của Django ---------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        in_l1 = self._in_l1(key)
+        if in_l1:
+            value = self._l1_get(l1_key)
+            self._count('l1', value is not _MISSING)
+            if value is not _MISSING:
+                return value
+        if not self.use_l2:
+            return default
+
+        value, l1_timeout = self._l2_get(key, version, in_l1)
+        self._count('l2', value is not _MISSING)
+        if value is _MISSING:
+            return default
+        if in_l1:
+            self._l1_set(l1_key, value, l1_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remaining = []
+        for key in keys:
+            l1_key = self.make_and_validate_key(key, version=version)
+            in_l1 = self._in_l1(key)
+            value = self._l1_get(l1_key) if in_l1 else _MISSING
+            if in_l1:
+                self._count('l1', value is not _MISSING)
+            if value is _MISSING:
+                remaining.append(key)
+            else:
+                found[key] = value
+
+        if remaining and self.use_l2 and hasattr(self.l2, 'get_with_expiry'):
+            # Đọc từng key kèm hạn ở L2 (get_many của FileBasedCache cũng đọc từng file)
+            for key in remaining:
+                in_l1 = self._in_l1(key)
+                value, l1_timeout = self._l2_get(key, version, in_l1)
+                self._count('l2', value is not _MISSING)
+                if value is _MISSING:
+                    continue
+                if in_l1:
+                    self._l1_set(self.make_key(key, version=version), value, l1_timeout)
+                found[key] = value
+        elif remaining and self.use_l2:
+            fetched = self.l2.get_many(remaining, version=version)
+            for key in remaining:
+                self._count('l2', key in fetched)
+            for key, value in fetched.items():
+                if self._in_l1(key):
+                    self._l1_set(self.make_key(key, version=version), value, self.l1_timeout)
+                found[key] = value
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        l1_key = self.make_and_validate_key(key, version=version)
+        if self.use_l2:
+            self.l2.set(key, value, timeout, version=version)
+        if self._in_l1(key):
+            self._l1_set(l1_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        failed = []
+        if self.use_l2:
+            failed = self.l2.set_many(data, timeout, version=version)
+        if self.use_l1:
+            for key, value in data.items():
+                if key not in failed and self._in_l1(key):
+                    self._l1_set(self.make_and_validate_key(key, version=version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        l1_key = self.make_and_validate_key(key, version=version)
+        if not self.use_l2:
+            if self._l1_get(l1_key) is not _MISSING:
+                return False
+            self._l1_set(l1_key, value, timeout)
+            return True
+
+        added = self.l2.add(key, value, timeout, version=version)
+        if self._in_l1(key):
+            if added:
+                self._l1_set(l1_key, value, timeout)
+            else:
+                # Key đã có ở L2: bỏ bản L1 (có thể đã cũ) để lần get sau đọc lại L2
+                self._l1_delete(l1_key)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        l1_key = self.make_and_validate_key(key, version=version)
+        if self.use_l2:
+            touched = self.l2.touch(key, timeout, version=version)
+            if self.use_l1:
+                self._l1_delete(l1_key)
+            return touched
+        value = self._l1_get(l1_key)
+        if value is _MISSING:
+            return False
+        self._l1_set(l1_key, value, timeout)
+        return True
+
+    def delete(self, key, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        deleted = self._l1_delete(l1_key) if self.use_l1 else False
+        if self.use_l2:
+            deleted = self.l2.delete(key, version=version)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        if self.use_l1:
+            for key in keys:
+                self._l1_delete(self.make_and_validate_key(key, version=version))
+        if self.use_l2:
+            self.l2.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        if self._in_l1(key) and self._l1_get(l1_key) is not _MISSING:
+            return True
+        return self.use_l2 and self.l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        if not self.use_l2:
+            with self._lock:
+                entry = self._l1.get(l1_key)
+                if entry is None or (entry[0] is not None and entry[0] <= time.monotonic()):
+                    raise ValueError(f"Key '{key}' not found")
+                value = pickle.loads(entry[1]) + delta
+                self._l1[l1_key] = (entry[0], pickle.dumps(value, self.pickle_protocol))
+            return value
+
+        # Bộ đếm dùng chung giữa các process -> luôn tăng ở L2. Không giữ bản sao ở
+        # L1: process khác incr tiếp thì bản sao đã cũ mà vẫn được trả về.
+        value = self.l2.incr(key, delta, version=version)
+        if self.use_l1:
+            self._l1_delete(l1_key)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        if self.use_l2:
+            self.l2.clear()
+
+
+class LockingFileBasedCache(FileBasedCache):
+    """
+    FileBasedCache có set/add/delete/touch/incr/decr atomic giữa các process
+    (khóa file chung trong thư mục cache), incr giữ nguyên hạn của key thay vì
+    đặt lại TIMEOUT mặc định, và get_with_expiry() cho TieredCache biết hạn
+    còn lại của key.
+    """
+    lock_filename = 'incr.lock'  # không có đuôi .djcache -> clear()/cull bỏ qua
+
+    def _locked(self):
+        self._createdir()
+        return _FileLock(os.path.join(self._dir, self.lock_filename))
+
+    def get_with_expiry(self, key, default=None, version=None):
+        """(value, hạn dạng time.time() | None); (default, None) nếu không có / hết hạn."""
+        fname = self._key_to_file(key, version)
+        try:
+            with open(fname, 'rb') as f:
+                expiry = pickle.load(f)
+                if expiry is not None and expiry < time.time():
+                    return default, None
+                return pickle.loads(zlib.decompress(f.read())), expiry
+        except (FileNotFoundError, EOFError):
+            return default, None
+
+    # add() của FileBasedCache gọi self.set() -> khóa phải vào lại được trong cùng thread
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked():
+            super().set(key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked():
+            return super().add(key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked():
+            return super().touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        with self._locked():
+            return super().delete(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        fname = self._key_to_file(key, version)
+        with self._locked():
+            try:
+                with open(fname, 'rb') as f:
+                    expiry = pickle.load(f)
+                    value = pickle.loads(zlib.decompress(f.read()))
+            except (FileNotFoundError, EOFError):
+                raise ValueError(f"Key '{key}' not found")
+            if expiry is not None and expiry < time.time():
+                self._delete(fname)
+                raise ValueError(f"Key '{key}' not found")
+
+            value += delta
+            # Ghi ra file tạm rồi rename như set(): process đang get không đọc phải file ghi dở
+            fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+            renamed = False
+            try:
+                with open(fd, 'wb') as f:
+                    f.write(pickle.dumps(expiry, self.pickle_protocol))
+                    f.write(zlib.compress(pickle.dumps(value, self.pickle_protocol)))
+                file_move_safe(tmp_path, fname, allow_overwrite=True)
+                renamed = True
+            finally:
+                if not renamed:
+                    os.remove(tmp_path)
+        return value
+
+
+class _FileLock:
+    """Khóa độc quyền trên 1 file, vào lại được trong cùng thread (flock không đệ quy)."""
+    _held = threading.local()
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        depth = getattr(self._held, self.path, 0)
+        if not depth:
+            self._file = open(self.path, 'ab')
+            locks.lock(self._file, locks.LOCK_EX)
+        setattr(self._held, self.path, depth + 1)
+        return self
+
+    def __exit__(self, *exc):
+        depth = getattr(self._held, self.path) - 1
+        setattr(self._held, self.path, depth)
+        if depth or self._file is None:
+            return
+        try:
+            locks.unlock(self._file)
+        finally:
+            self._file.close()
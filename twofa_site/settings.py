@@ -1,4 +1,5 @@
 import os
+from datetime import date
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -95,16 +96,94 @@ USE_I18N = True
 USE_TZ = False
 
 # Caching configuration
+# Cache 2 tầng (twofa_site.cache.TieredCache): L1 LRU trong process + L2 dùng chung.
+# L2 phải có incr atomic giữa các worker. Mặc định là file trên đĩa local có khóa khi
+# incr (LockingFileBasedCache, chỉ đúng khi các worker chạy chung 1 máy); nhiều máy thì
+# đổi sang Redis/Memcached bằng CACHE_SHARED_BACKEND / CACHE_SHARED_LOCATION (vd
+# django.core.cache.backends.redis.RedisCache, redis://127.0.0.1:6379/1).
+# TIERS chọn tầng cho từng alias: 'l1+l2' | 'l1' | 'l2'.
+CACHE_SHARED_BACKEND = os.getenv("CACHE_SHARED_BACKEND", "twofa_site.cache.LockingFileBasedCache")
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
-        'LOCATION': 'app_cache_table',
+        'BACKEND': 'twofa_site.cache.TieredCache',
         'OPTIONS': {
-            'MAX_ENTRIES': 1000
+            'SHARED': 'shared',
+            'TIERS': os.getenv("CACHE_TIERS", "l1+l2"),
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+            # Version / bộ đếm (được incr) luôn đọc thẳng L2, không trễ theo L1_TIMEOUT
+            'L2_ONLY': [
+                'forum:thread_version:',
+                'forum:category_version:',
+                'forum_category_tree_version',
+                'forum:unread:',
+                'forum:events:',
+            ],
         }
-    }
+    },
+    'shared': {
+        'BACKEND': CACHE_SHARED_BACKEND,
+        'LOCATION': os.getenv("CACHE_SHARED_LOCATION", str(BASE_DIR / "cache")),
+        # OPTIONS của Redis/Memcached được chuyển thẳng cho client -> chỉ đặt cho cache file
+        'OPTIONS': {'MAX_ENTRIES': 10000} if CACHE_SHARED_BACKEND.endswith("FileBasedCache") else {},
+    },
 }
 
+# --- FORUM ---
+# Lượt xem thread được gom trong bộ nhớ và ghi xuống DB mỗi N giây (forum.view_buffer)
+FORUM_VIEW_FLUSH_INTERVAL = int(os.getenv("FORUM_VIEW_FLUSH_INTERVAL", "10"))
+# Buffer vượt quá số lượt này thì flush sớm
+FORUM_VIEW_MAX_PENDING = 5000
+# Flush lỗi liên tục (DB down) thì chỉ giữ tối đa chừng này ThreadView trong bộ nhớ
+# (bộ đếm Thread.views vẫn được giữ đủ)
+FORUM_VIEW_MAX_RETAINED = 50000
+# rollup_thread_views chỉ đẩy watermark qua các ThreadView cũ hơn N giây: view_buffer
+# của process khác có thể đang ghi dở 1 lô id nhỏ hơn (phải lớn hơn FLUSH_INTERVAL)
+FORUM_VIEW_ROLLUP_LAG = 300
+# ThreadView thô cũ hơn N ngày (đã rollup vào ThreadViewDaily) sẽ bị xóa; None = giữ mãi
+FORUM_THREAD_VIEW_RETENTION_DAYS = 30
+# Trọng số điểm trending (forum.trending): lượt xem/bài viết trong N ngày gần nhất,
+# giảm một nửa sau mỗi HALF_LIFE_DAYS ngày
+FORUM_TRENDING_WINDOW_DAYS = 7
+FORUM_TRENDING_VIEW_WEIGHT = 1.0
+FORUM_TRENDING_POST_WEIGHT = 2.0
+FORUM_TRENDING_HALF_LIFE_DAYS = 2.0
+# Snapshot cây category trong mỗi process chỉ kiểm tra lại version tối đa mỗi N giây (forum.category_tree)
+FORUM_CATEGORY_TREE_CHECK_INTERVAL = 2
+# Số follower xử lý mỗi lô khi gửi notification reply ở nền (forum.notify)
+FORUM_NOTIFY_CHUNK_SIZE = 500
+# Bộ đếm notification chưa đọc trong cache được đếm lại từ DB sau tối đa N giây (forum.unread)
+FORUM_UNREAD_RECONCILE_SECONDS = 600
+# Broker cho kênh SSE (forum.events): InProcessBroker khi chạy 1 worker,
+# CacheBroker (qua cache dùng chung FORUM_EVENTS_CACHE_ALIAS) khi chạy nhiều worker
+FORUM_EVENTS_BROKER = os.getenv("FORUM_EVENTS_BROKER", "forum.events.InProcessBroker")
+FORUM_EVENTS_CACHE_ALIAS = "shared"
+# Cache nguyên trang home/category/thread cho khách (forum.page_cache); hết hạn theo version
+# nội dung, timeout chỉ giới hạn độ trễ của lượt xem/thống kê. 0 = tắt
+FORUM_PAGE_CACHE_TIMEOUT = int(os.getenv("FORUM_PAGE_CACHE_TIMEOUT", "600"))
+FORUM_PAGE_CACHE_ALIAS = "default"
+# Tìm kiếm (forum.search_engine): đọc tối đa N posting mỗi query; từ có mặt trong
+# hơn tỉ lệ này số document là stopword, bị bỏ qua khi query còn từ khác
+FORUM_SEARCH_MAX_POSTINGS = 50000
+FORUM_SEARCH_STOPWORD_RATIO = 0.2
+# SlugRedirectMiddleware bỏ qua các prefix này (không có slug tiếng Việt)
+FORUM_SLUG_REDIRECT_EXCLUDE_PREFIXES = ["/static/", "/media/", "/admin/"]
+
+# --- ACCOUNTS ---
+# SecurityLog được ghi theo lô ở nền (accounts.security_log): flush mỗi N giây
+# hoặc khi hàng đợi đủ BATCH_SIZE sự kiện
+SECURITY_LOG_FLUSH_INTERVAL = 2
+SECURITY_LOG_BATCH_SIZE = 200
+# Ghi lỗi liên tục (DB down) thì chỉ giữ tối đa chừng này sự kiện trong bộ nhớ
+SECURITY_LOG_MAX_PENDING = 10000
+# manage.py archive_security_logs: log cũ hơn N ngày được chuyển ra file JSONL nén
+# (SECURITY_LOG_ARCHIVE_DIR, mỗi tháng 1 file) rồi xóa khỏi DB
+SECURITY_LOG_RETENTION_DAYS = 180
+SECURITY_LOG_ARCHIVE_DIR = BASE_DIR / "archive" / "security_logs"
+# Mã khôi phục tạo trước khi có fingerprint được cấp lại ở lần đăng nhập 2FA kế tiếp,
+# và chỉ còn được chấp nhận tới hết ngày này (None = không giới hạn)
+BACKUP_CODE_LEGACY_UNTIL = date(2027, 1, 31)
+
 # --- STATIC FILES (SỬA LẠI ĐƯỜNG DẪN) ---
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "static_collected"